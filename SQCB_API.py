@@ -1,23 +1,147 @@
-import mysql.connector
-from flask import Flask, jsonify
+import os
+import traceback
+from flask import Flask, jsonify, request, Response, stream_with_context
+
+from config import create_db_connection, discard_connection
+from compression import init_compression
+from json_provider import FastJSONProvider
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+init_compression(app)
+
+# Read-only table browser: streams rows as NDJSON from pooled replica connections
+BROWSABLE_TABLES = set(filter(None, os.environ.get(
+    'SQCB_BROWSABLE_TABLES',
+    'sqcb_detail,supp_detail,part_detail,notification_detail,picture,attachments,hd_plant,user_detail'
+).split(',')))
+HIDDEN_COLUMNS = {'password_hash'}
+CHUNK_SIZE = 500
+MAX_LIMIT = 1000000
+
+_table_columns = {}
+
+def table_columns(table):
+    # Returns ([visible columns], keyset column or None); cached per process
+    if table not in _table_columns:
+        connection = None
+        cursor = None
+        try:
+            connection = create_db_connection(read_only=True)
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT COLUMN_NAME, COLUMN_KEY
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                ORDER BY ORDINAL_POSITION
+            """, (table,))
+            rows = cursor.fetchall()
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+        columns = [name for name, _ in rows if name not in HIDDEN_COLUMNS]
+        primary = [name for name, key in rows if key == 'PRI']
+        _table_columns[table] = (columns, primary[0] if len(primary) == 1 else None)
+    return _table_columns[table]
+
+def open_rows(connection, table, columns, key_column, after, limit):
+    # Runs the export query up front, so errors surface before the response starts
+    query = f"SELECT {', '.join(f'`{column}`' for column in columns)} FROM `{table}`"
+    params = []
+    if key_column:
+        if after is not None:
+            query += f" WHERE `{key_column}` > %s"
+            params.append(after)
+        query += f" ORDER BY `{key_column}`"
+    query += " LIMIT %s"
+    params.append(limit)
+    # Unbuffered: rows stay on the server until fetched, one chunk at a time
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(query, params)
+    return cursor
+
+def stream_rows(connection, cursor, columns):
+    finished = False
+    try:
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            yield "".join(app.json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+        finished = True
+    finally:
+        if finished:
+            cursor.close()
+            connection.close()
+        else:
+            # Client went away mid-stream: draining could mean reading up to MAX_LIMIT rows,
+            # so drop the server session rather than recycle it
+            discard_connection(connection)
+
+@app.route('/tables', methods=['GET'])
+def list_tables():
+    try:
+        tables = {}
+        for table in sorted(BROWSABLE_TABLES):
+            columns, key_column = table_columns(table)
+            tables[table] = {"columns": columns, "keyset_column": key_column}
+        return jsonify(tables), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+# ?columns=a,b&after=<last key>&limit=<n>; the next page starts after the last row's keyset column
+@app.route('/tables/<table>', methods=['GET'])
+def export_table(table):
+    try:
+        if table not in BROWSABLE_TABLES:
+            return jsonify({"error": f"Table '{table}' is not browsable"}), 404
+        all_columns, key_column = table_columns(table)
+        if not all_columns:
+            return jsonify({"error": f"Table '{table}' not found"}), 404
+
+        columns = all_columns
+        if request.args.get('columns'):
+            columns = [column.strip() for column in request.args['columns'].split(',') if column.strip()]
+            unknown = [column for column in columns if column not in all_columns]
+            if unknown:
+                return jsonify({"error": f"Unknown column(s): {', '.join(unknown)}"}), 400
+            if key_column and key_column not in columns:
+                columns.insert(0, key_column)
+
+        after = request.args.get('after')
+        if after is not None and not key_column:
+            return jsonify({"error": f"Table '{table}' has no single-column key to page on"}), 400
+        limit = min(request.args.get('limit', MAX_LIMIT, type=int), MAX_LIMIT)
 
-# การเชื่อมต่อกับ MySQL
-mydb = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="Kk@1234859",
-    database="/sqcb"
-)
+        connection = create_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"error": "Database unavailable"}), 503
+        try:
+            cursor = open_rows(connection, table, columns, key_column, after, max(limit, 1))
+        except Exception:
+            connection.close()
+            raise
+        response = Response(
+            stream_with_context(stream_rows(connection, cursor, columns)),
+            mimetype='application/x-ndjson'
+        )
+        if key_column:
+            response.headers['X-Keyset-Column'] = key_column
+        return response
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
 
-# ฟังก์ชันในการดึงข้อมูล
+# Kept for existing callers: /get_data?table=<name>
 @app.route('/get_data', methods=['GET'])
 def get_data():
-    cursor = mydb.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM your_table")
-    rows = cursor.fetchall()
-    return jsonify(rows)
+    table = request.args.get('table')
+    if not table:
+        return jsonify({"error": "table is required", "tables": sorted(BROWSABLE_TABLES)}), 400
+    return export_table(table)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,29 +1,231 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS, cross_origin
 import os
 import json
+import math
 import traceback
+import threading
+from functools import wraps
 from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 
 # Your DB connection helper
-from config import create_db_connection
+from config import create_db_connection, POOL_SIZE, REPLICA_DBS, STICKY_SECONDS
+from lookup_index import PrefixIndex
+from search_index import SearchIndex
+from sessions import SessionManager, last_login_writer
+from ratelimit import TokenBucketLimiter, LoadShedder, queue_seconds
+from compression import init_compression
+from json_provider import FastJSONProvider
+from queries import fetch_named, fetch_one_named, statement_stats, warm_statements
+from upload_processing import UploadRejected, prepare_picture, prepare_attachment
 
 import mysql.connector  # or import from your config file
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+app.config['JSON_ISO_DATES'] = bool(os.environ.get('SQCB_JSON_ISO_DATES'))
+# Read by the per-route @cross_origin() decorators as well as the app-wide CORS
+app.config['CORS_EXPOSE_HEADERS'] = ['X-Last-Write', 'X-Next-After']
 CORS(app, resources={r"/*": {"origins": "*"}})
+init_compression(app)
 
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Requests above this are refused with 413 before the body is read
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('SQCB_MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
+
+# Without SQCB_SECRET_KEY a random key is drawn at import: gunicorn (preload_app) draws it once
+# in the master and every worker shares it, but under uvicorn --workers each process draws
+# its own and a token only validates in the worker that issued it
+app.config['SECRET_KEY'] = os.environ.get('SQCB_SECRET_KEY') or os.urandom(32)
+if 'SQCB_SECRET_KEY' not in os.environ:
+    print("SQCB_SECRET_KEY is not set; session tokens will not survive a restart")
+app.config['SESSION_MAX_AGE'] = int(os.environ.get('SQCB_SESSION_MAX_AGE', 8 * 3600))
+session_manager = SessionManager(app.config['SECRET_KEY'], max_age=app.config['SESSION_MAX_AGE'])
+
+# Behind a reverse proxy (e.g. Render) the client address comes from X-Forwarded-For
+# Render sets RENDER=true and always fronts the app with one proxy hop
+TRUST_PROXY_HOPS = int(os.environ.get('SQCB_TRUST_PROXY') or (1 if os.environ.get('RENDER') else 0))
+if TRUST_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUST_PROXY_HOPS)
+
+# Rate limits are in tokens per second; expensive endpoints cost more than one token
+RATE_LIMIT_RATE = float(os.environ.get('SQCB_RATE_LIMIT_RATE', 10))
+RATE_LIMIT_BURST = float(os.environ.get('SQCB_RATE_LIMIT_BURST', 60))
+ROUTE_COSTS = {
+    'get_all_sqcb': 5,
+    'create_sqcb': 5,
+    'update_sqcb': 5,
+    'batch_update_sqcb': 5,
+    'login': 5,
+    'search_sqcb': 2,
+    'get_all_users': 2,
+}
+EXPENSIVE_COST = 5
+ip_limiter = TokenBucketLimiter(RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+# Behind an untrusted proxy every client shares the proxy's address, so the per-IP bucket
+# is only used when the client address is known: proxy hops trusted, or a directly exposed
+# server that opts in with SQCB_RATE_LIMIT_BY_IP
+LIMIT_BY_IP = bool(TRUST_PROXY_HOPS or os.environ.get('SQCB_RATE_LIMIT_BY_IP'))
+if not LIMIT_BY_IP:
+    print("Neither SQCB_TRUST_PROXY nor SQCB_RATE_LIMIT_BY_IP is set; per-IP rate limiting is disabled")
+user_limiter = TokenBucketLimiter(RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+# Shed by how long a request waited for a worker thread (X-Request-Start, stamped by the
+# worker in gunicorn.conf.py); expensive requests give up sooner so cheap ones keep flowing
+load_shedder = LoadShedder(
+    float(os.environ.get('SQCB_MAX_QUEUE_SECONDS', 5)),
+    float(os.environ.get('SQCB_MAX_EXPENSIVE_QUEUE_SECONDS', 1))
+)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+# Type-ahead indexes, loaded on first use and kept current by create/update
+supplier_index = PrefixIndex('supp_detail', 'supplier_code', 'supplier_name')
+part_index = PrefixIndex('part_detail', 'part_number', 'part_name')
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Full-text index over SQCBs, maintained on every SQCB write
+search_index = SearchIndex()
+SEARCH_DEFAULT_PER_PAGE = 20
+SEARCH_MAX_PER_PAGE = 100
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def prepare_files(pictures_files, attachments_files):
+    # Sniffs, size-checks and normalizes every upload before anything is written; raises UploadRejected
+    pictures = []
+    for f in pictures_files:
+        if not f or not f.filename:
+            continue
+        if not allowed_file(f.filename):
+            raise UploadRejected(f"'{f.filename}' is not an allowed picture type ({', '.join(sorted(ALLOWED_EXTENSIONS))})")
+        pictures.append(prepare_picture(f, secure_filename(f.filename)))
+    attachments = [
+        prepare_attachment(f, secure_filename(f.filename))
+        for f in attachments_files if f and f.filename
+    ]
+    return pictures, attachments
+
+@app.before_request
+def reject_oversized_body():
+    # Checked against Content-Length so the body is never spooled; views catch broad exceptions
+    max_length = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is not None and request.content_length > max_length:
+        return request_too_large(None)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Upload exceeds the {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB request limit"}), 413
+
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+HEALTH_ENDPOINTS = {'healthz', 'readyz', 'statements_metrics'}
+
+# Set by warm_up() once this process can serve traffic, cleared while draining
+app_ready = threading.Event()
+
+def warm_up():
+    # Runs in each worker after fork: fill the pools, prepare hot lookups, load the in-memory indexes.
+    # Statements are prepared per connection, so every pooled connection is checked out and
+    # held until all are warmed; replica checkouts rotate across the replicas' pools
+    checkouts = [False] * POOL_SIZE + [True] * (POOL_SIZE * len(REPLICA_DBS))
+    connections = []
+    try:
+        for read_only in checkouts:
+            connection = create_db_connection(read_only=read_only)
+            if not connection:
+                break
+            connections.append(connection)
+            warm_statements(connection)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        for connection in connections:
+            connection.close()
+    for index in (supplier_index, part_index, search_index):
+        try:
+            index.ensure_loaded()
+        except Exception:
+            traceback.print_exc()
+    app_ready.set()
+
+def start_draining():
+    app_ready.clear()
+
+def bearer_token():
+    auth = request.headers.get('Authorization', '')
+    return auth[7:].strip() if auth[:7].lower() == 'bearer ' else None
+
+@app.before_request
+def load_session():
+    g.session = session_manager.validate(bearer_token())
+
+@app.before_request
+def limit_request():
+    if request.method == 'OPTIONS' or request.endpoint is None or request.endpoint in HEALTH_ENDPOINTS:
+        return None
+    cost = ROUTE_COSTS.get(request.endpoint, 1)
+    retry_after = ip_limiter.take(f"ip:{request.remote_addr}", cost) if LIMIT_BY_IP else 0
+    if not retry_after and g.session:
+        retry_after = user_limiter.take(f"user:{g.session['user_id']}", cost)
+    if retry_after:
+        response = jsonify({"error": "Too many requests"})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
+    if load_shedder.should_shed(queue_seconds(request.headers.get('X-Request-Start')), cost >= EXPENSIVE_COST):
+        response = jsonify({"error": "Server busy, try again shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+def session_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get('session') is None:
+            return jsonify({"error": "Valid session token required"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+# Read-your-writes: a successful write hands the client a signed marker, returned as a cookie
+# or echoed in X-Last-Write; while it is younger than STICKY_SECONDS, that client reads from
+# the primary on whichever worker serves it
+LAST_WRITE_COOKIE = 'sqcb_last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+last_write_signer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='sqcb-last-write')
+
+def wrote_recently(incoming=None):
+    # incoming: the current request; the ASGI app passes its own
+    incoming = incoming if incoming is not None else request
+    marker = incoming.headers.get(LAST_WRITE_HEADER) or incoming.cookies.get(LAST_WRITE_COOKIE)
+    if not marker:
+        return False
+    try:
+        last_write_signer.loads(marker, max_age=STICKY_SECONDS)
+    except BadSignature:
+        return False
+    return True
+
+def create_read_connection():
+    return create_db_connection(read_only=not wrote_recently())
+
+def mark_write(response):
+    marker = last_write_signer.dumps(1)
+    response.set_cookie(LAST_WRITE_COOKIE, marker, max_age=math.ceil(STICKY_SECONDS), httponly=True, samesite='Lax')
+    response.headers[LAST_WRITE_HEADER] = marker
+
+@app.after_request
+def remember_write(response):
+    if REPLICA_DBS and request.method in WRITE_METHODS and response.status_code < 400:
+        mark_write(response)
+    return response
+
 def empty_string_to_none(s, default=None):
     return s if s != '' else default
 
@@ -43,43 +245,51 @@ def parse_date(s):
             print(f"Could not parse date string: '{s}'")
             return None
 
-def supplier_exists(supplier_code):
-    connection = None
-    cursor = None
+# sqcb_detail columns written by PUT /sqcb/<id>, grouped by how the form value is read
+SQCB_VALUE_FIELDS = ('sqcb', 'status', 'rqmr_no', 'plant_id', 'hd_incharge', 'supplier_code', 'disposition', 'comments')
+SQCB_NULLABLE_FIELDS = ('return_type', 'sqcb_amount', 'rma_no', 'po_no', 'obd_no', 'scrap_week', 'second_po_no', 'second_obd_no')
+SQCB_DATE_FIELDS = ('feedback_date', 'target_date', 'qm10_complete_date', 'dn_issued_date')
+SQCB_UPDATE_FIELDS = SQCB_VALUE_FIELDS + SQCB_NULLABLE_FIELDS + SQCB_DATE_FIELDS
+
+def value_changed(old, new):
+    # Form values arrive as strings, DB values come back typed (int, Decimal, date)
+    if old is None or new is None:
+        return (old is None) != (new is None)
+    if isinstance(old, (int, float, Decimal)) and not isinstance(old, bool):
+        try:
+            return Decimal(str(old)) != Decimal(str(new).strip())
+        except InvalidOperation:
+            return True
+    return str(old) != str(new)
+
+def index_parts(parts_json):
+    if not parts_json:
+        return
     try:
-        connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        query = "SELECT supplier_name FROM supp_detail WHERE supplier_code = %s"
-        cursor.execute(query, (supplier_code,))
-        result = cursor.fetchone()
+        for part in json.loads(parts_json):
+            part_index.upsert(part.get('part_number'), part.get('part_name'))
+    except Exception:
+        traceback.print_exc()
+
+def part_key(part):
+    return (str(part.get('notification_number')), str(part.get('item_number')))
+
+def supplier_exists(connection, supplier_code):
+    # Runs on the caller's connection so validation doesn't open one of its own
+    try:
+        result = fetch_one_named(connection, 'supplier_name', (supplier_code,))
         return result['supplier_name'] if result else None
     except Exception as e:
         traceback.print_exc()
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-def plant_exists(plant_id):
-    connection = None
-    cursor = None
+def plant_exists(connection, plant_id):
     try:
-        connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        query = "SELECT plant_id FROM hd_plant WHERE plant_id = %s"
-        cursor.execute(query, (plant_id,))
-        result = cursor.fetchone()
+        result = fetch_one_named(connection, 'plant_exists', (plant_id,))
         return True if result else False
     except Exception as e:
         traceback.print_exc()
         return False
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 ##############################################################################
 # GET /sqcb - Only return non-deleted SQCB rows
@@ -88,98 +298,22 @@ def plant_exists(plant_id):
 @cross_origin()
 def get_all_sqcb():
     connection = None
-    cursor = None
     try:
-        connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        sqcb_query = """
-        SELECT
-            sqcb_detail.id AS sqcb_id,
-            sqcb_detail.sqcb,
-            sqcb_detail.status,
-            sqcb_detail.rqmr_no,
-            sqcb_detail.disposition,
-            sqcb_detail.plant_id,
-            sqcb_detail.hd_incharge,
-            sqcb_detail.sqcb_amount,
-            sqcb_detail.feedback_date,
-            sqcb_detail.target_date,
-            sqcb_detail.rma_no,
-            sqcb_detail.return_type,
-            sqcb_detail.qm10_complete_date,
-            sqcb_detail.dn_issued_date,
-            sqcb_detail.scrap_week,
-            sqcb_detail.po_no,
-            sqcb_detail.obd_no,
-            sqcb_detail.second_po_no,
-            sqcb_detail.second_obd_no,
-            sqcb_detail.comments,
-            sqcb_detail.modified,
-            supp_detail.supplier_code,
-            supp_detail.supplier_name,
-            user_detail.fullname AS created_by,
-            user_detail.fullname AS modified_by
-        FROM sqcb_detail
-        LEFT JOIN supp_detail 
-          ON sqcb_detail.supplier_code = supp_detail.supplier_code
-        LEFT JOIN user_detail 
-          ON sqcb_detail.hd_incharge = user_detail.fullname
-        WHERE sqcb_detail.is_deleted = 0
-        """
-        cursor.execute(sqcb_query)
-        sqcb_rows = cursor.fetchall()
+        connection = create_read_connection()
+        sqcb_rows = fetch_named(connection, 'sqcb_list')
+
+        # Parts and attachments of every live SQCB in one query each, grouped here
+        parts_by_sqcb = {}
+        for part in fetch_named(connection, 'sqcb_parts_all'):
+            part['pictures'] = app.json.loads(part['pictures']) if part['pictures'] else []
+            parts_by_sqcb.setdefault(part.pop('sqcb'), []).append(part)
+        attachments_by_sqcb = {}
+        for attachment in fetch_named(connection, 'sqcb_attachments_all'):
+            attachments_by_sqcb.setdefault(attachment['sqcb'], []).append(attachment)
 
         for sqcb in sqcb_rows:
-            sqcb_number = sqcb['sqcb']
-            # Fetch Parts
-            parts_query = """
-            SELECT
-                notification_detail.item_number,
-                notification_detail.notification_number,
-                notification_detail.qty,
-                part_detail.part_number,
-                part_detail.part_name,
-                COALESCE(
-                    JSON_ARRAYAGG(
-                        JSON_OBJECT(
-                            'picture_name', picture.picture_name,
-                            'picture_address', picture.picture_address
-                        )
-                    ), '[]'
-                ) AS pictures
-            FROM notification_detail
-            LEFT JOIN part_detail 
-              ON notification_detail.part_number = part_detail.part_number
-            LEFT JOIN picture 
-              ON notification_detail.notification_number = picture.notification_number
-              AND picture.is_deleted = 0
-            WHERE notification_detail.sqcb = %s
-              AND notification_detail.is_deleted = 0
-            GROUP BY
-                notification_detail.item_number,
-                notification_detail.notification_number,
-                notification_detail.qty,
-                part_detail.part_number,
-                part_detail.part_name
-            """
-            cursor.execute(parts_query, (sqcb_number,))
-            parts = cursor.fetchall()
-            for part in parts:
-                part['pictures'] = json.loads(part['pictures']) if part['pictures'] else []
-            sqcb['parts'] = parts
-
-            # Fetch Attachments
-            attachments_query = """
-            SELECT
-                attachment_id, sqcb, attachment_item_id,
-                attachment_name, attachment_address
-            FROM attachments
-            WHERE sqcb = %s
-              AND is_deleted = 0
-            """
-            cursor.execute(attachments_query, (sqcb_number,))
-            attachments = cursor.fetchall()
-            sqcb['attachments'] = attachments
+            sqcb['parts'] = parts_by_sqcb.get(sqcb['sqcb'], [])
+            sqcb['attachments'] = attachments_by_sqcb.get(sqcb['sqcb'], [])
 
         return jsonify(sqcb_rows), 200
 
@@ -187,6 +321,73 @@ def get_all_sqcb():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+    finally:
+        if connection:
+            connection.close()
+
+##############################################################################
+# GET /sqcb/search?q=<words>&page=<n>&per_page=<n> - Ranked full-text search
+##############################################################################
+@app.route('/sqcb/search', methods=['GET'])
+@cross_origin()
+def search_sqcb():
+    connection = None
+    cursor = None
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "q is required"}), 400
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', SEARCH_DEFAULT_PER_PAGE, type=int), 1), SEARCH_MAX_PER_PAGE)
+
+        total, hits = search_index.search(query, (page - 1) * per_page, per_page)
+        results = []
+        if hits:
+            connection = create_read_connection()
+            cursor = connection.cursor(dictionary=True)
+            ids = [doc_id for doc_id, _ in hits]
+            cursor.execute(f"""
+            SELECT
+                sqcb_detail.id AS sqcb_id,
+                sqcb_detail.sqcb,
+                sqcb_detail.status,
+                sqcb_detail.rqmr_no,
+                sqcb_detail.disposition,
+                sqcb_detail.plant_id,
+                sqcb_detail.hd_incharge,
+                sqcb_detail.feedback_date,
+                sqcb_detail.target_date,
+                sqcb_detail.rma_no,
+                sqcb_detail.po_no,
+                sqcb_detail.obd_no,
+                sqcb_detail.comments,
+                sqcb_detail.modified,
+                supp_detail.supplier_code,
+                supp_detail.supplier_name
+            FROM sqcb_detail
+            LEFT JOIN supp_detail
+              ON sqcb_detail.supplier_code = supp_detail.supplier_code
+            WHERE sqcb_detail.id IN ({", ".join(["%s"] * len(ids))})
+              AND sqcb_detail.is_deleted = 0
+            """, ids)
+            rows = {row['sqcb_id']: row for row in cursor.fetchall()}
+            for doc_id, score in hits:
+                if doc_id in rows:
+                    rows[doc_id]['score'] = round(score, 4)
+                    results.append(rows[doc_id])
+
+        return jsonify({
+            "query": query,
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "results": results
+        }), 200
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
     finally:
         if cursor:
             cursor.close()
@@ -200,13 +401,9 @@ def get_all_sqcb():
 @cross_origin()
 def get_supplier_name(supplier_code):
     connection = None
-    cursor = None
     try:
-        connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        query = "SELECT supplier_name FROM supp_detail WHERE supplier_code = %s"
-        cursor.execute(query, (supplier_code,))
-        result = cursor.fetchone()
+        connection = create_read_connection()
+        result = fetch_one_named(connection, 'supplier_name', (supplier_code,))
         if result:
             return jsonify(result), 200
         else:
@@ -215,8 +412,6 @@ def get_supplier_name(supplier_code):
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
     finally:
-        if cursor:
-            cursor.close()
         if connection:
             connection.close()
 
@@ -227,13 +422,9 @@ def get_supplier_name(supplier_code):
 @cross_origin()
 def get_part_info(part_number):
     connection = None
-    cursor = None
     try:
-        connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        query = "SELECT part_number, part_name FROM part_detail WHERE part_number = %s"
-        cursor.execute(query, (part_number,))
-        result = cursor.fetchone()
+        connection = create_read_connection()
+        result = fetch_one_named(connection, 'part_info', (part_number,))
         if result:
             return jsonify(result), 200
         else:
@@ -242,11 +433,31 @@ def get_part_info(part_number):
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
     finally:
-        if cursor:
-            cursor.close()
         if connection:
             connection.close()
 
+##############################################################################
+# GET /autocomplete/suppliers?q=<prefix> and /autocomplete/parts?q=<prefix>
+##############################################################################
+def autocomplete(index):
+    try:
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT, type=int), AUTOCOMPLETE_MAX_LIMIT)
+        return jsonify(index.search(query, max(limit, 1))), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/autocomplete/suppliers', methods=['GET'])
+@cross_origin()
+def autocomplete_suppliers():
+    return autocomplete(supplier_index)
+
+@app.route('/autocomplete/parts', methods=['GET'])
+@cross_origin()
+def autocomplete_parts():
+    return autocomplete(part_index)
+
 ##############################################################################
 # POST /sqcb - Create a new SQCB
 ##############################################################################
@@ -262,22 +473,26 @@ def create_sqcb():
         data = request.form
         attachments_files = request.files.getlist('attachments')
         pictures_files = request.files.getlist('pictures')
+        try:
+            pictures, attachments = prepare_files(pictures_files, attachments_files)
+        except UploadRejected as e:
+            return jsonify({"error": str(e)}), e.status_code
 
         # Validate plant and supplier
         plant_id = data.get('plant_id')
         if not plant_id:
             return jsonify({"error": "plant_id is required"}), 400
-        if not plant_exists(plant_id):
-            return jsonify({"error": f"plant_id '{plant_id}' does not exist"}), 400
-
         supplier_code = data.get('supplier_code')
         if not supplier_code:
             return jsonify({"error": "supplier_code is required"}), 400
-        supplier_name = supplier_exists(supplier_code)
+
+        connection = create_db_connection()
+        if not plant_exists(connection, plant_id):
+            return jsonify({"error": f"plant_id '{plant_id}' does not exist"}), 400
+        supplier_name = supplier_exists(connection, supplier_code)
         if not supplier_name:
             return jsonify({"error": f"supplier_code '{supplier_code}' not in supp_detail"}), 400
 
-        connection = create_db_connection()
         cursor = connection.cursor()
 
         disposition_value = data.get('disposition') or 'WAITING FEEDBACK'
@@ -345,7 +560,7 @@ def create_sqcb():
                 cursor.execute(part_query, part_values)
 
         # Insert pictures
-        if pictures_files:
+        if pictures:
             try:
                 parts_data = json.loads(data.get('parts', '[]'))
                 notification_number = parts_data[0].get('notification_number') if parts_data else None
@@ -355,67 +570,67 @@ def create_sqcb():
                 cursor.execute("SELECT COALESCE(MAX(picture_item_id), 0) FROM picture")
                 current_max_id = cursor.fetchone()[0]
 
-                for index, picture_file in enumerate(pictures_files, 1):
-                    if picture_file and picture_file.filename and allowed_file(picture_file.filename):
-                        new_id = current_max_id + index
-                        picture_id = f"{notification_number}_{str(new_id).zfill(3)}"
-                        filename = secure_filename(picture_file.filename)
-                        unique_filename = f"{picture_id}_{filename}"
-                        save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                        picture_file.save(save_path)
-                        picture_query = """
-                        INSERT INTO picture (
-                            picture_id, notification_number, picture_item_id,
-                            picture_name, picture_address
-                        )
-                        VALUES (%s, %s, %s, %s, %s)
-                        """
-                        picture_values = (
-                            picture_id,
-                            notification_number,
-                            new_id,
-                            filename,
-                            save_path
-                        )
-                        cursor.execute(picture_query, picture_values)
+                for index, picture in enumerate(pictures, 1):
+                    new_id = current_max_id + index
+                    picture_id = f"{notification_number}_{str(new_id).zfill(3)}"
+                    filename = picture.filename
+                    unique_filename = f"{picture_id}_{filename}"
+                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+                    picture.save(save_path)
+                    picture_query = """
+                    INSERT INTO picture (
+                        picture_id, notification_number, picture_item_id,
+                        picture_name, picture_address
+                    )
+                    VALUES (%s, %s, %s, %s, %s)
+                    """
+                    picture_values = (
+                        picture_id,
+                        notification_number,
+                        new_id,
+                        filename,
+                        save_path
+                    )
+                    cursor.execute(picture_query, picture_values)
             except Exception as e:
                 connection.rollback()
                 traceback.print_exc()
                 return jsonify({"error": f"Failed to upload pictures: {str(e)}"}), 500
 
         # Insert attachments
-        if attachments_files:
+        if attachments:
             try:
                 cursor.execute("SELECT COALESCE(MAX(attachment_item_id), 0) FROM attachments")
                 max_attachment_item_id = cursor.fetchone()[0]
-                for attachment_file in attachments_files:
-                    if attachment_file.filename:
-                        max_attachment_item_id += 1
-                        attachment_id = f"{data.get('sqcb')}_{str(max_attachment_item_id).zfill(3)}"
-                        filename = secure_filename(attachment_file.filename)
-                        save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        attachment_file.save(save_path)
-                        attachment_query = """
-                        INSERT INTO attachments (
-                            attachment_id, sqcb, attachment_item_id, 
-                            attachment_name, attachment_address
-                        )
-                        VALUES (%s, %s, %s, %s, %s)
-                        """
-                        attachment_values = (
-                            attachment_id,
-                            data.get('sqcb'),
-                            max_attachment_item_id,
-                            filename,
-                            save_path
-                        )
-                        cursor.execute(attachment_query, attachment_values)
+                for attachment in attachments:
+                    max_attachment_item_id += 1
+                    attachment_id = f"{data.get('sqcb')}_{str(max_attachment_item_id).zfill(3)}"
+                    filename = attachment.filename
+                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                    attachment.save(save_path)
+                    attachment_query = """
+                    INSERT INTO attachments (
+                        attachment_id, sqcb, attachment_item_id, 
+                        attachment_name, attachment_address
+                    )
+                    VALUES (%s, %s, %s, %s, %s)
+                    """
+                    attachment_values = (
+                        attachment_id,
+                        data.get('sqcb'),
+                        max_attachment_item_id,
+                        filename,
+                        save_path
+                    )
+                    cursor.execute(attachment_query, attachment_values)
             except Exception as e:
                 connection.rollback()
                 traceback.print_exc()
                 return jsonify({"error": f"Failed to upload attachments: {str(e)}"}), 500
 
         connection.commit()
+        index_parts(data.get('parts'))
+        search_index.reindex([sqcb_id])
         return jsonify({"message": "SQCB created successfully", "sqcb_id": sqcb_id}), 201
 
     except Exception as e:
@@ -432,6 +647,7 @@ def create_sqcb():
 
 ##############################################################################
 # PUT /sqcb/<id> - Update SQCB (preserve date fields if not provided)
+# Only changed columns, parts and new files are written
 ##############################################################################
 @app.route('/sqcb/<int:id>', methods=['PUT'])
 @cross_origin()
@@ -448,6 +664,10 @@ def update_sqcb(id):
         data = request.form
         attachments_files = request.files.getlist('attachments')
         pictures_files = request.files.getlist('pictures')
+        try:
+            pictures, attachments = prepare_files(pictures_files, attachments_files)
+        except UploadRejected as e:
+            return jsonify({"error": str(e)}), e.status_code
 
         connection = create_db_connection()
         cursor = connection.cursor(dictionary=True)
@@ -481,158 +701,324 @@ def update_sqcb(id):
             # In all other cases, preserve the existing value
             return existing_data.get(field)
 
-        update_query = """
-        UPDATE sqcb_detail
-        SET 
-            sqcb=%s,
-            status=%s,
-            rqmr_no=%s,
-            plant_id=%s,
-            hd_incharge=%s,
-            supplier_code=%s,
-            return_type=%s,
-            sqcb_amount=%s,
-            feedback_date=%s,
-            target_date=%s,
-            disposition=%s,
-            rma_no=%s,
-            qm10_complete_date=%s,
-            po_no=%s,
-            obd_no=%s,
-            dn_issued_date=%s,
-            scrap_week=%s,
-            second_po_no=%s,
-            second_obd_no=%s,
-            comments=%s
-        WHERE id=%s
-          AND is_deleted=0
-        """
-        update_values = (
-            get_value('sqcb'),
-            get_value('status'),
-            get_value('rqmr_no'),
-            get_value('plant_id'),
-            get_value('hd_incharge'),
-            get_value('supplier_code'),
-            empty_string_to_none(get_value('return_type')),
-            empty_string_to_none(get_value('sqcb_amount')),
-            get_date_field('feedback_date'),
-            get_date_field('target_date'),
-            get_value('disposition'),
-            empty_string_to_none(get_value('rma_no')),
-            get_date_field('qm10_complete_date'),
-            empty_string_to_none(get_value('po_no')),
-            empty_string_to_none(get_value('obd_no')),
-            get_date_field('dn_issued_date'),
-            empty_string_to_none(get_value('scrap_week')),
-            empty_string_to_none(get_value('second_po_no')),
-            empty_string_to_none(get_value('second_obd_no')),
-            get_value('comments'),
-            id
-        )
-        cursor.execute(update_query, update_values)
+        # Only write the columns whose value actually differs from the stored row
+        new_values = {}
+        for field in SQCB_VALUE_FIELDS:
+            new_values[field] = get_value(field)
+        for field in SQCB_NULLABLE_FIELDS:
+            new_values[field] = empty_string_to_none(get_value(field))
+        for field in SQCB_DATE_FIELDS:
+            new_values[field] = get_date_field(field)
+
+        changed_fields = [
+            field for field in SQCB_UPDATE_FIELDS
+            if value_changed(existing_data.get(field), new_values[field])
+        ]
+        if changed_fields:
+            update_query = f"""
+            UPDATE sqcb_detail
+            SET {", ".join(f"{field}=%s" for field in changed_fields)}
+            WHERE id=%s
+              AND is_deleted=0
+            """
+            update_values = [new_values[field] for field in changed_fields]
+            update_values.append(id)
+            cursor.execute(update_query, update_values)
 
-        # Update Parts: Soft-delete old parts then insert new ones.
+        # Update Parts: diff against the current rows, touch only what changed
         parts_data = data.get('parts')
         if parts_data:
             parts_data = json.loads(parts_data)
-            cursor.execute("UPDATE notification_detail SET is_deleted=1 WHERE sqcb = %s", (existing_data['sqcb'],))
-            for part in parts_data:
-                notification_query = """
-                INSERT INTO notification_detail (
-                    notification_number, sqcb, item_number, qty, part_number
-                )
-                VALUES (%s, %s, %s, %s, %s)
-                """
-                notification_values = (
-                    part.get('notification_number'),
-                    existing_data['sqcb'],
-                    part.get('item_number'),
-                    part.get('qty'),
-                    part.get('part_number')
-                )
-                cursor.execute(notification_query, notification_values)
-                part_query = """
-                INSERT INTO part_detail (part_number, part_name)
-                VALUES (%s, %s)
-                ON DUPLICATE KEY UPDATE part_name=VALUES(part_name)
-                """
-                part_values = (part.get('part_number'), part.get('part_name'))
-                cursor.execute(part_query, part_values)
-
-        # Update Pictures: Soft-delete old ones and insert new
-        if pictures_files:
             cursor.execute("""
-                UPDATE picture
-                SET is_deleted=1
-                WHERE notification_number IN (
-                    SELECT notification_number 
-                    FROM notification_detail
-                    WHERE sqcb = %s
-                )
+                SELECT
+                    nd.notification_number,
+                    nd.item_number,
+                    nd.qty,
+                    nd.part_number,
+                    pd.part_name
+                FROM notification_detail nd
+                LEFT JOIN part_detail pd
+                  ON nd.part_number = pd.part_number
+                WHERE nd.sqcb = %s
+                  AND nd.is_deleted = 0
             """, (existing_data['sqcb'],))
+            current_parts = {part_key(row): row for row in cursor.fetchall()}
+
+            incoming_parts = {}
+            for part in parts_data:
+                incoming_parts[part_key(part)] = part
+
+            for key, part in incoming_parts.items():
+                current = current_parts.get(key)
+                if current is None:
+                    notification_query = """
+                    INSERT INTO notification_detail (
+                        notification_number, sqcb, item_number, qty, part_number
+                    )
+                    VALUES (%s, %s, %s, %s, %s)
+                    """
+                    notification_values = (
+                        part.get('notification_number'),
+                        existing_data['sqcb'],
+                        part.get('item_number'),
+                        part.get('qty'),
+                        part.get('part_number')
+                    )
+                    cursor.execute(notification_query, notification_values)
+                elif (value_changed(current['qty'], part.get('qty'))
+                      or value_changed(current['part_number'], part.get('part_number'))):
+                    cursor.execute("""
+                        UPDATE notification_detail
+                        SET qty=%s, part_number=%s
+                        WHERE sqcb=%s
+                          AND notification_number=%s
+                          AND item_number=%s
+                          AND is_deleted=0
+                    """, (
+                        part.get('qty'),
+                        part.get('part_number'),
+                        existing_data['sqcb'],
+                        current['notification_number'],
+                        current['item_number']
+                    ))
+
+                if (current is None
+                        or value_changed(current['part_number'], part.get('part_number'))
+                        or value_changed(current['part_name'], part.get('part_name'))):
+                    part_query = """
+                    INSERT INTO part_detail (part_number, part_name)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE part_name=VALUES(part_name)
+                    """
+                    part_values = (part.get('part_number'), part.get('part_name'))
+                    cursor.execute(part_query, part_values)
+
+            removed_keys = [key for key in current_parts if key not in incoming_parts]
+            for key in removed_keys:
+                cursor.execute("""
+                    UPDATE notification_detail
+                    SET is_deleted=1,
+                        deleted_at=NOW()
+                    WHERE sqcb=%s
+                      AND notification_number=%s
+                      AND item_number=%s
+                      AND is_deleted=0
+                """, (existing_data['sqcb'], current_parts[key]['notification_number'], current_parts[key]['item_number']))
+
+            # Pictures hang off notification_number; drop them once no live part uses it
+            kept_numbers = {key[0] for key in incoming_parts}
+            orphaned_numbers = sorted({key[0] for key in removed_keys} - kept_numbers)
+            if orphaned_numbers:
+                placeholders = ", ".join(["%s"] * len(orphaned_numbers))
+                cursor.execute(f"""
+                    UPDATE picture
+                    SET is_deleted=1,
+                        deleted_at=NOW()
+                    WHERE notification_number IN ({placeholders})
+                      AND is_deleted=0
+                """, orphaned_numbers)
+
+        # Update Pictures: append the new files to the existing ones
+        if pictures:
             parts_data = json.loads(data.get('parts', '[]'))
             notification_number = parts_data[0].get('notification_number') if parts_data else None
             if notification_number:
-                cursor.execute("SELECT COALESCE(MAX(picture_item_id), 0) FROM picture")
-                current_max_id = cursor.fetchone()['COALESCE(MAX(picture_item_id), 0)']
-                for index, picture_file in enumerate(pictures_files, 1):
-                    if picture_file.filename and allowed_file(picture_file.filename):
-                        new_id = current_max_id + index
-                        picture_id = f"{notification_number}_{str(new_id).zfill(3)}"
-                        filename = secure_filename(picture_file.filename)
-                        unique_filename = f"{picture_id}_{filename}"
-                        save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                        picture_file.save(save_path)
-                        picture_query = """
-                        INSERT INTO picture (
-                            picture_id, notification_number, picture_item_id,
-                            picture_name, picture_address
-                        )
-                        VALUES (%s, %s, %s, %s, %s)
-                        """
-                        picture_values = (
-                            picture_id,
-                            notification_number,
-                            new_id,
-                            filename,
-                            save_path
-                        )
-                        cursor.execute(picture_query, picture_values)
-
-        # Update Attachments
-        if attachments_files:
-            cursor.execute("UPDATE attachments SET is_deleted = 1 WHERE sqcb = %s", (existing_data['sqcb'],))
-            cursor.execute("SELECT COALESCE(MAX(attachment_item_id), 0) AS maxId FROM attachments")
-            attach_row = cursor.fetchone()
-            max_attachment_item_id = attach_row['maxId'] if attach_row else 0
-            for attachment_file in attachments_files:
-                if attachment_file.filename:
-                    max_attachment_item_id += 1
-                    attachment_id = f"{existing_data['sqcb']}_{str(max_attachment_item_id).zfill(3)}"
-                    filename = secure_filename(attachment_file.filename)
-                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                cursor.execute("SELECT COALESCE(MAX(picture_item_id), 0) AS maxId FROM picture")
+                current_max_id = cursor.fetchone()['maxId']
+                for index, picture in enumerate(pictures, 1):
+                    new_id = current_max_id + index
+                    picture_id = f"{notification_number}_{str(new_id).zfill(3)}"
+                    filename = picture.filename
+                    unique_filename = f"{picture_id}_{filename}"
+                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
                     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    attachment_file.save(save_path)
-                    attachment_query = """
-                    INSERT INTO attachments (
-                        attachment_id, sqcb, attachment_item_id,
-                        attachment_name, attachment_address
+                    picture.save(save_path)
+                    picture_query = """
+                    INSERT INTO picture (
+                        picture_id, notification_number, picture_item_id,
+                        picture_name, picture_address
                     )
                     VALUES (%s, %s, %s, %s, %s)
                     """
-                    attachment_values = (
-                        attachment_id,
-                        existing_data['sqcb'],
-                        max_attachment_item_id,
+                    picture_values = (
+                        picture_id,
+                        notification_number,
+                        new_id,
                         filename,
                         save_path
                     )
-                    cursor.execute(attachment_query, attachment_values)
+                    cursor.execute(picture_query, picture_values)
+
+        # Update Attachments: append the new files to the existing ones
+        if attachments:
+            cursor.execute("SELECT COALESCE(MAX(attachment_item_id), 0) AS maxId FROM attachments")
+            attach_row = cursor.fetchone()
+            max_attachment_item_id = attach_row['maxId'] if attach_row else 0
+            for attachment in attachments:
+                max_attachment_item_id += 1
+                attachment_id = f"{existing_data['sqcb']}_{str(max_attachment_item_id).zfill(3)}"
+                filename = attachment.filename
+                save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+                attachment.save(save_path)
+                attachment_query = """
+                INSERT INTO attachments (
+                    attachment_id, sqcb, attachment_item_id,
+                    attachment_name, attachment_address
+                )
+                VALUES (%s, %s, %s, %s, %s)
+                """
+                attachment_values = (
+                    attachment_id,
+                    existing_data['sqcb'],
+                    max_attachment_item_id,
+                    filename,
+                    save_path
+                )
+                cursor.execute(attachment_query, attachment_values)
 
         connection.commit()
-        return jsonify({"message": "SQCB updated successfully"}), 200
+        index_parts(data.get('parts'))
+        search_index.reindex([id])
+        return jsonify({"message": "SQCB updated successfully", "updated_fields": changed_fields}), 200
+
+    except Exception as e:
+        traceback.print_exc()
+        if connection:
+            connection.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+##############################################################################
+# PATCH /sqcb - Batch partial update of many SQCBs (JSON)
+##############################################################################
+SQCB_PATCH_FIELDS = (
+    'status', 'disposition', 'rqmr_no', 'hd_incharge', 'comments',
+    'return_type', 'sqcb_amount', 'rma_no', 'po_no', 'obd_no', 'scrap_week', 'second_po_no', 'second_obd_no',
+    'feedback_date', 'target_date', 'qm10_complete_date', 'dn_issued_date'
+)
+MAX_PATCH_ITEMS = 500
+
+def parse_patch_item(item):
+    # Returns (id, {field: value}) or raises ValueError with a message for the caller
+    if not isinstance(item, dict):
+        raise ValueError("Each update must be an object")
+    try:
+        sqcb_id = int(item.get('id'))
+    except (TypeError, ValueError):
+        raise ValueError("id must be an integer")
+
+    fields = {}
+    for field, value in item.items():
+        if field == 'id':
+            continue
+        if field not in SQCB_PATCH_FIELDS:
+            raise ValueError(f"Field '{field}' cannot be patched")
+        if value is not None and not isinstance(value, str):
+            value = str(value)
+        if field in SQCB_DATE_FIELDS:
+            parsed = parse_date(value)
+            if value and value.strip() and parsed is None:
+                raise ValueError(f"Invalid date for '{field}': '{value}'")
+            fields[field] = parsed
+        elif field in ('status', 'disposition'):
+            if not value or value.strip() == "":
+                raise ValueError(f"'{field}' cannot be empty")
+            fields[field] = value
+        else:
+            fields[field] = empty_string_to_none(value)
+    if not fields:
+        raise ValueError("No fields to update")
+    return sqcb_id, fields
+
+@app.route('/sqcb', methods=['PATCH'])
+@cross_origin()
+def batch_update_sqcb():
+    connection = None
+    cursor = None
+    try:
+        data = request.get_json(silent=True)
+        updates = data.get('updates') if isinstance(data, dict) else data
+        if not isinstance(updates, list) or not updates:
+            return jsonify({"error": "A non-empty 'updates' list is required"}), 400
+        if len(updates) > MAX_PATCH_ITEMS:
+            return jsonify({"error": f"At most {MAX_PATCH_ITEMS} updates per request"}), 400
+
+        # One result per input item, in request order
+        results = [None] * len(updates)
+        pending = {}
+        pending_indexes = {}
+        for index, item in enumerate(updates):
+            try:
+                sqcb_id, fields = parse_patch_item(item)
+            except ValueError as e:
+                item_id = item.get('id') if isinstance(item, dict) else None
+                results[index] = {"index": index, "id": item_id, "status": "error", "error": str(e)}
+                continue
+            # Repeated ids are merged, later values win
+            pending.setdefault(sqcb_id, {}).update(fields)
+            pending_indexes.setdefault(sqcb_id, []).append(index)
+
+        if pending:
+            connection = create_db_connection()
+            cursor = connection.cursor()
+
+            ids = list(pending)
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"SELECT id FROM sqcb_detail WHERE id IN ({placeholders}) AND is_deleted = 0",
+                ids
+            )
+            found_ids = {row[0] for row in cursor.fetchall()}
+            for sqcb_id in ids:
+                if sqcb_id not in found_ids:
+                    for index in pending_indexes[sqcb_id]:
+                        results[index] = {"index": index, "id": sqcb_id, "status": "error", "error": "SQCB not found or is deleted"}
+                    del pending[sqcb_id]
+
+            # One UPDATE per distinct set of fields; per-row values go through CASE id
+            groups = {}
+            for sqcb_id, fields in pending.items():
+                groups.setdefault(tuple(sorted(fields)), []).append(sqcb_id)
+
+            for field_group, group_ids in groups.items():
+                set_clauses = []
+                set_values = []
+                for field in field_group:
+                    values = [pending[sqcb_id][field] for sqcb_id in group_ids]
+                    if all(value == values[0] for value in values):
+                        set_clauses.append(f"{field} = %s")
+                        set_values.append(values[0])
+                    else:
+                        set_clauses.append(f"{field} = CASE id {' '.join(['WHEN %s THEN %s'] * len(group_ids))} END")
+                        for sqcb_id, value in zip(group_ids, values):
+                            set_values.extend((sqcb_id, value))
+                group_placeholders = ", ".join(["%s"] * len(group_ids))
+                cursor.execute(f"""
+                    UPDATE sqcb_detail
+                    SET {", ".join(set_clauses)}
+                    WHERE id IN ({group_placeholders})
+                      AND is_deleted = 0
+                """, set_values + group_ids)
+                for sqcb_id in group_ids:
+                    for index in pending_indexes[sqcb_id]:
+                        results[index] = {"index": index, "id": sqcb_id, "status": "updated", "fields": list(field_group)}
+
+            connection.commit()
+            search_index.reindex(list(pending))
+
+        updated = sum(1 for result in results if result['status'] == 'updated')
+        return jsonify({
+            "message": f"{updated} of {len(results)} update(s) applied",
+            "updated": updated,
+            "failed": len(results) - updated,
+            "results": results
+        }), 200
 
     except Exception as e:
         traceback.print_exc()
@@ -692,6 +1078,7 @@ def soft_delete_sqcb(id):
             )
         """, (sqcb_str,))
         connection.commit()
+        search_index.remove(id)
         return jsonify({"message": "SQCB soft-deleted successfully"}), 200
 
     except Exception as e:
@@ -738,6 +1125,34 @@ def delete_attachment(attachment_id):
         if connection:
             connection.close()
 
+# Columns a client may ask for with ?fields= on /users and /profile/<id>
+USER_FIELDS = ('user_id', 'username', 'name', 'surname', 'fullname', 'job_description', 'email', 'supplier_code', 'role')
+# password_hash is never selectable: login compares it to the raw password
+USER_SELECTABLE_FIELDS = USER_FIELDS + ('supplier_name',)
+PROFILE_DEFAULT_FIELDS = USER_SELECTABLE_FIELDS
+USERS_MAX_LIMIT = 1000
+
+def parse_user_fields(default):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(default)
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in requested if field not in USER_SELECTABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    # user_id is the pagination key, so it is always returned
+    if 'user_id' not in requested:
+        requested.insert(0, 'user_id')
+    return requested
+
+def user_select_columns(fields):
+    return ", ".join('sd.supplier_name' if field == 'supplier_name' else f'ud.{field}' for field in fields)
+
+def user_supplier_join(fields):
+    if 'supplier_name' not in fields:
+        return ""
+    return "LEFT JOIN supp_detail sd ON ud.supplier_code = sd.supplier_code"
+
 ##############################################################################
 # GET /profile/<int:user_id>
 ##############################################################################
@@ -747,23 +1162,14 @@ def get_profile(user_id):
     connection = None
     cursor = None
     try:
-        connection = create_db_connection()
+        fields = parse_user_fields(PROFILE_DEFAULT_FIELDS)
+        connection = create_read_connection()
         cursor = connection.cursor(dictionary=True)
-        sql = """
-            SELECT 
-                ud.user_id,
-                ud.username,
-                ud.name,
-                ud.surname,
-                ud.fullname,
-                ud.job_description,
-                ud.email,
-                ud.supplier_code,
-                ud.role,
-                sd.supplier_name
+        # supp_detail is only joined when supplier_name is asked for
+        sql = f"""
+            SELECT {user_select_columns(fields)}
             FROM user_detail ud
-            LEFT JOIN supp_detail sd 
-                ON ud.supplier_code = sd.supplier_code
+            {user_supplier_join(fields)}
             WHERE ud.user_id = %s
         """
         cursor.execute(sql, (user_id,))
@@ -772,6 +1178,9 @@ def get_profile(user_id):
             return jsonify({"error": f"User with ID {user_id} not found"}), 404
         return jsonify(user), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -885,7 +1294,6 @@ def delete_profile(user_id):
 @cross_origin()
 def login():
     connection = None
-    cursor = None
     try:
         data = request.json
         username = data.get('username')
@@ -895,47 +1303,28 @@ def login():
             return jsonify({"error": "Username and password are required"}), 400
 
         connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-
-        user_query = """
-            SELECT ud.user_id, ud.username, ud.password_hash, ud.name, 
-                   ud.surname, ud.fullname, ud.job_description, ud.email,
-                   ud.supplier_code, ud.role
-            FROM user_detail ud
-            WHERE ud.username = %s AND ud.password_hash = %s
-        """
-        cursor.execute(user_query, (username, password))
-        user = cursor.fetchone()
+        user = fetch_one_named(connection, 'login_user', (username, password))
 
         if not user:
             return jsonify({"error": "Invalid credentials"}), 401
 
+        # last_login is written in the background, batched with other logins
         now = datetime.now()
-        auth_query = """
-            INSERT INTO user_authentication (user_id, password_hash, last_login)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            password_hash = VALUES(password_hash),
-            last_login = VALUES(last_login)
-        """
-        cursor.execute(auth_query, (user['user_id'], password, now))
-        connection.commit()
+        last_login_writer.record(user['user_id'], password, now)
         user.pop('password_hash', None)
         return jsonify({
             "message": "Login successful",
             "user": user,
+            "token": session_manager.issue(user),
+            "expires_in": app.config['SESSION_MAX_AGE'],
             "last_login": now.strftime('%Y-%m-%d %H:%M:%S')
         }), 200
 
     except Exception as e:
-        if connection:
-            connection.rollback()
         print("Login error:", str(e))
         return jsonify({"error": "Login failed"}), 500
 
     finally:
-        if cursor:
-            cursor.close()
         if connection:
             connection.close()
 
@@ -943,16 +1332,25 @@ def login():
 @cross_origin()
 def logout():
     try:
-        user_id = request.json.get('user_id')
+        data = request.get_json(silent=True) or {}
+        user_id = data.get('user_id') or (g.session['user_id'] if g.get('session') else None)
         if not user_id:
             return jsonify({"error": "User ID required"}), 400
-        # Typically, invalidate session/token here
+        token = bearer_token()
+        if token:
+            session_manager.revoke(token)
         return jsonify({"message": "Logout successful"}), 200
 
     except Exception as e:
         print("Logout error:", str(e))
         return jsonify({"error": "Logout failed"}), 500
 
+@app.route('/auth/session', methods=['GET'])
+@cross_origin()
+@session_required
+def get_session():
+    return jsonify({"user_id": g.session['user_id'], "role": g.session.get('role')}), 200
+
 ##############################################################################
 # GET /users
 ##############################################################################
@@ -962,16 +1360,45 @@ def get_all_users():
     connection = None
     cursor = None
     try:
-        connection = create_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        query = """
-            SELECT user_id, username, password_hash, name, surname, fullname,
-                   job_description, email, supplier_code, role
-            FROM user_detail
+        fields = parse_user_fields(USER_FIELDS)
+        conditions = []
+        params = []
+        for column in ('role', 'supplier_code'):
+            value = request.args.get(column)
+            if value:
+                conditions.append(f"ud.{column} = %s")
+                params.append(value)
+
+        # Keyset pagination: ?limit=<n>&after=<last user_id of the previous page>
+        limit = request.args.get('limit', type=int)
+        after = request.args.get('after', type=int)
+        if after is not None:
+            conditions.append("ud.user_id > %s")
+            params.append(after)
+
+        query = f"""
+            SELECT {user_select_columns(fields)}
+            FROM user_detail ud
+            {user_supplier_join(fields)}
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY ud.user_id
         """
-        cursor.execute(query)
+        if limit is not None:
+            limit = min(max(limit, 1), USERS_MAX_LIMIT)
+            query += " LIMIT %s"
+            params.append(limit + 1)
+
+        connection = create_read_connection()
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, params)
         users = cursor.fetchall()
-        return jsonify(users), 200
+        response = jsonify(users[:limit] if limit is not None else users)
+        if limit is not None and len(users) > limit:
+            response.headers['X-Next-After'] = str(users[limit - 1]['user_id'])
+        return response, 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         traceback.print_exc()
@@ -983,5 +1410,35 @@ def get_all_users():
         if connection:
             connection.close()
 
+##############################################################################
+# GET /healthz (process is up), GET /readyz (warmed up and DB reachable)
+# and GET /metrics/statements (prepared statement counters)
+##############################################################################
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/metrics/statements', methods=['GET'])
+def statements_metrics():
+    return jsonify(statement_stats()), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    if not app_ready.is_set():
+        return jsonify({"status": "not ready"}), 503
+    connection = None
+    try:
+        connection = create_db_connection()
+        if not connection or not connection.is_connected():
+            return jsonify({"status": "database unavailable"}), 503
+        return jsonify({"status": "ready"}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "database unavailable", "error": str(e)}), 503
+    finally:
+        if connection:
+            connection.close()
+
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=True, port=5000)
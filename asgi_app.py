@@ -0,0 +1,402 @@
+# asgi_app.py
+# Optional async serving mode: `uvicorn asgi_app:application --workers 4`
+# (or hypercorn). Needs quart, aiomysql, aiofiles and asgiref on top of requirements.txt.
+#
+# The hot routes below run natively on aiomysql pools, with the same SQL
+# (queries.HOT_QUERIES), replica routing and compression as the Flask app; every
+# other route of app.py is forwarded to the Flask app through asgiref's
+# WsgiToAsgi, which buffers the request body asynchronously before handing it
+# to a thread.
+import asyncio
+import itertools
+import json
+import os
+import traceback
+from datetime import datetime
+
+import aiofiles
+import aiomysql
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, request, jsonify, g
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+from werkzeug.routing import RequestRedirect
+
+from config import PRIMARY_DB, REPLICA_DBS
+from compression import choose_encoding, compressible, compress_cached, MIN_SIZE
+from json_provider import FastJSONProvider
+from queries import HOT_QUERIES
+from upload_processing import UploadRejected
+from app import (
+    app as flask_app,
+    prepare_files, empty_string_to_none, parse_date, index_parts,
+    search_index, session_manager, last_login_writer, ip_limiter, user_limiter, ROUTE_COSTS, LIMIT_BY_IP,
+    wrote_recently, mark_write, WRITE_METHODS
+)
+
+ASYNC_POOL_SIZE = int(os.environ.get('SQCB_ASYNC_POOL_SIZE', 20))
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)
+app.config['JSON_ISO_DATES'] = flask_app.config['JSON_ISO_DATES']
+app.config['UPLOAD_FOLDER'] = flask_app.config['UPLOAD_FOLDER']
+app.config['MAX_CONTENT_LENGTH'] = flask_app.config['MAX_CONTENT_LENGTH']
+
+def create_pool(settings, minsize):
+    return aiomysql.create_pool(
+        host=settings['host'],
+        port=settings['port'],
+        user=settings['user'],
+        password=settings['password'],
+        db=settings['database'],
+        minsize=minsize,
+        maxsize=ASYNC_POOL_SIZE,
+        # Reads leave no open transaction, so release() keeps the connection; writes call begin()
+        autocommit=True,
+        pool_recycle=3600
+    )
+
+@app.before_serving
+async def open_pool():
+    app.db_pool = await create_pool(PRIMARY_DB, 1)
+    # Replicas connect lazily so one that is down does not stop the server starting
+    app.replica_pools = [await create_pool(settings, 0) for settings in REPLICA_DBS]
+    app.replica_cycle = itertools.cycle(app.replica_pools)
+
+@app.after_serving
+async def close_pool():
+    for pool in [app.db_pool] + app.replica_pools:
+        pool.close()
+        await pool.wait_closed()
+
+async def fetch_all(query, params=None, read_only=False):
+    # Reads go to a replica unless this client wrote recently; a failing replica falls back to the primary
+    pools = [app.db_pool]
+    if read_only and app.replica_pools and not wrote_recently(request):
+        pools.insert(0, next(app.replica_cycle))
+    for pool in pools:
+        try:
+            async with pool.acquire() as connection:
+                async with connection.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(query, params)
+                    return await cursor.fetchall()
+        except aiomysql.OperationalError:
+            if pool is app.db_pool:
+                raise
+            traceback.print_exc()
+
+async def write_file(path, data):
+    async with aiofiles.open(path, 'wb') as f:
+        await f.write(data)
+
+async def fetch_one(query, params=None, read_only=False):
+    rows = await fetch_all(query, params, read_only)
+    return rows[0] if rows else None
+
+@app.before_request
+async def reject_oversized_body():
+    # Same check as the Flask app: refuse on Content-Length before the body is read
+    if request.content_length is not None and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        return request_too_large(None)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Upload exceeds the {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB request limit"}), 413
+
+@app.before_request
+async def load_session_and_limit():
+    auth = request.headers.get('Authorization', '')
+    g.session = session_manager.validate(auth[7:].strip() if auth[:7].lower() == 'bearer ' else None)
+    if request.method == 'OPTIONS' or request.endpoint is None:
+        return None
+    cost = ROUTE_COSTS.get(request.endpoint, 1)
+    # Behind a proxy, run uvicorn with --forwarded-allow-ips so remote_addr is the client's
+    retry_after = ip_limiter.take(f"ip:{request.remote_addr}", cost) if LIMIT_BY_IP else 0
+    if not retry_after and g.session:
+        retry_after = user_limiter.take(f"user:{g.session['user_id']}", cost)
+    if retry_after:
+        response = jsonify({"error": "Too many requests"})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
+@app.after_request
+async def finish_response(response):
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Expose-Headers'] = ', '.join(flask_app.config['CORS_EXPOSE_HEADERS'])
+    if REPLICA_DBS and request.method in WRITE_METHODS and response.status_code < 400:
+        mark_write(response)
+
+    # Same negotiation as compression.compress_response; Quart bodies are read asynchronously
+    if not compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding') or '')
+    if encoding is None:
+        return response
+    data = await response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+    response.set_data(await asyncio.to_thread(compress_cached, encoding, data))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+##############################################################################
+# GET /sqcb - list, parts and attachments fetched concurrently
+##############################################################################
+@app.route('/sqcb', methods=['GET'])
+async def get_all_sqcb():
+    try:
+        sqcb_rows, parts, attachments = await asyncio.gather(
+            fetch_all(HOT_QUERIES['sqcb_list'], read_only=True),
+            fetch_all(HOT_QUERIES['sqcb_parts_all'], read_only=True),
+            fetch_all(HOT_QUERIES['sqcb_attachments_all'], read_only=True)
+        )
+
+        parts_by_sqcb = {}
+        for part in parts:
+            part['pictures'] = app.json.loads(part['pictures']) if part['pictures'] else []
+            parts_by_sqcb.setdefault(part.pop('sqcb'), []).append(part)
+        attachments_by_sqcb = {}
+        for attachment in attachments:
+            attachments_by_sqcb.setdefault(attachment['sqcb'], []).append(attachment)
+        for sqcb in sqcb_rows:
+            sqcb['parts'] = parts_by_sqcb.get(sqcb['sqcb'], [])
+            sqcb['attachments'] = attachments_by_sqcb.get(sqcb['sqcb'], [])
+
+        return jsonify(sqcb_rows), 200
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+##############################################################################
+# GET /suppliers/<supplier_code> and GET /part/<part_number>
+##############################################################################
+@app.route('/suppliers/<supplier_code>', methods=['GET'])
+async def get_supplier_name(supplier_code):
+    try:
+        result = await fetch_one(HOT_QUERIES['supplier_name'], (supplier_code,), read_only=True)
+        if result:
+            return jsonify(result), 200
+        return jsonify({"error": "Supplier not found"}), 404
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/part/<part_number>', methods=['GET'])
+async def get_part_info(part_number):
+    try:
+        result = await fetch_one(HOT_QUERIES['part_info'], (part_number,), read_only=True)
+        if result:
+            return jsonify(result), 200
+        return jsonify({"error": "Part not found"}), 404
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+##############################################################################
+# POST /sqcb - Create a new SQCB (plant/supplier checks run concurrently)
+##############################################################################
+@app.route('/sqcb', methods=['POST'])
+async def create_sqcb():
+    try:
+        data = await request.form
+        files = await request.files
+        if 'sqcb' not in data:
+            return jsonify({"error": "No SQCB data provided"}), 400
+        attachments_files = files.getlist('attachments')
+        pictures_files = files.getlist('pictures')
+        try:
+            # Sniffing and image re-encoding are CPU work, keep them off the event loop
+            pictures, attachments = await asyncio.to_thread(prepare_files, pictures_files, attachments_files)
+        except UploadRejected as e:
+            return jsonify({"error": str(e)}), e.status_code
+
+        plant_id = data.get('plant_id')
+        if not plant_id:
+            return jsonify({"error": "plant_id is required"}), 400
+        supplier_code = data.get('supplier_code')
+        if not supplier_code:
+            return jsonify({"error": "supplier_code is required"}), 400
+
+        plant, supplier = await asyncio.gather(
+            fetch_one(HOT_QUERIES['plant_exists'], (plant_id,)),
+            fetch_one(HOT_QUERIES['supplier_name'], (supplier_code,))
+        )
+        if not plant:
+            return jsonify({"error": f"plant_id '{plant_id}' does not exist"}), 400
+        if not supplier:
+            return jsonify({"error": f"supplier_code '{supplier_code}' not in supp_detail"}), 400
+
+        parts_data = json.loads(data.get('parts') or '[]')
+        notification_number = parts_data[0].get('notification_number') if parts_data else None
+        if pictures and not notification_number:
+            return jsonify({"error": "notification_number required for pictures"}), 400
+
+        async with app.db_pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await connection.begin()
+                    await cursor.execute("""
+                    INSERT INTO sqcb_detail (
+                        sqcb, status, rqmr_no, plant_id, hd_incharge, supplier_code, return_type,
+                        sqcb_amount, feedback_date, target_date, disposition, rma_no, qm10_complete_date,
+                        po_no, obd_no, dn_issued_date, scrap_week, second_po_no, second_obd_no, comments
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (
+                        data.get('sqcb'),
+                        data.get('status') or "Open",
+                        data.get('rqmr_no'),
+                        plant_id,
+                        data.get('hd_incharge'),
+                        supplier_code,
+                        empty_string_to_none(data.get('return_type')),
+                        empty_string_to_none(data.get('sqcb_amount')),
+                        parse_date(data.get('feedback_date')),
+                        parse_date(data.get('target_date')),
+                        data.get('disposition') or 'WAITING FEEDBACK',
+                        empty_string_to_none(data.get('rma_no')),
+                        parse_date(data.get('qm10_complete_date')),
+                        empty_string_to_none(data.get('po_no')),
+                        empty_string_to_none(data.get('obd_no')),
+                        parse_date(data.get('dn_issued_date')),
+                        empty_string_to_none(data.get('scrap_week')),
+                        empty_string_to_none(data.get('second_po_no')),
+                        empty_string_to_none(data.get('second_obd_no')),
+                        data.get('comments', '') or None
+                    ))
+                    sqcb_id = cursor.lastrowid
+
+                    if parts_data:
+                        await cursor.executemany("""
+                        INSERT INTO notification_detail (
+                            notification_number, sqcb, item_number, qty, part_number
+                        )
+                        VALUES (%s, %s, %s, %s, %s)
+                        """, [
+                            (part.get('notification_number'), data.get('sqcb'), part.get('item_number'),
+                             part.get('qty'), part.get('part_number'))
+                            for part in parts_data
+                        ])
+                        await cursor.executemany("""
+                        INSERT INTO part_detail (part_number, part_name)
+                        VALUES (%s, %s)
+                        ON DUPLICATE KEY UPDATE part_name=VALUES(part_name)
+                        """, [(part.get('part_number'), part.get('part_name')) for part in parts_data])
+
+                    # Files are written with aiofiles while the loop keeps serving
+                    saves = []
+                    if pictures:
+                        await cursor.execute("SELECT COALESCE(MAX(picture_item_id), 0) FROM picture")
+                        current_max_id = (await cursor.fetchone())[0]
+                        picture_rows = []
+                        for index, picture in enumerate(pictures, 1):
+                            new_id = current_max_id + index
+                            picture_id = f"{notification_number}_{str(new_id).zfill(3)}"
+                            save_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{picture_id}_{picture.filename}")
+                            saves.append(write_file(save_path, picture.data))
+                            picture_rows.append((picture_id, notification_number, new_id, picture.filename, save_path))
+                        if picture_rows:
+                            await cursor.executemany("""
+                            INSERT INTO picture (
+                                picture_id, notification_number, picture_item_id,
+                                picture_name, picture_address
+                            )
+                            VALUES (%s, %s, %s, %s, %s)
+                            """, picture_rows)
+
+                    if attachments:
+                        await cursor.execute("SELECT COALESCE(MAX(attachment_item_id), 0) FROM attachments")
+                        max_attachment_item_id = (await cursor.fetchone())[0]
+                        attachment_rows = []
+                        for attachment in attachments:
+                            max_attachment_item_id += 1
+                            attachment_id = f"{data.get('sqcb')}_{str(max_attachment_item_id).zfill(3)}"
+                            save_path = os.path.join(app.config['UPLOAD_FOLDER'], attachment.filename)
+                            saves.append(write_file(save_path, attachment.data))
+                            attachment_rows.append((attachment_id, data.get('sqcb'), max_attachment_item_id, attachment.filename, save_path))
+                        if attachment_rows:
+                            await cursor.executemany("""
+                            INSERT INTO attachments (
+                                attachment_id, sqcb, attachment_item_id,
+                                attachment_name, attachment_address
+                            )
+                            VALUES (%s, %s, %s, %s, %s)
+                            """, attachment_rows)
+
+                    await asyncio.gather(*saves)
+                    await connection.commit()
+                except Exception:
+                    await connection.rollback()
+                    raise
+
+        index_parts(data.get('parts'))
+        await asyncio.to_thread(search_index.reindex, [sqcb_id])
+        return jsonify({"message": "SQCB created successfully", "sqcb_id": sqcb_id}), 201
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 400
+
+##############################################################################
+# POST /auth/login
+##############################################################################
+@app.route('/auth/login', methods=['POST'])
+async def login():
+    try:
+        data = await request.get_json(silent=True) or {}
+        username = data.get('username')
+        password = data.get('password')
+        if not username or not password:
+            return jsonify({"error": "Username and password are required"}), 400
+
+        user = await fetch_one(HOT_QUERIES['login_user'], (username, password))
+        if not user:
+            return jsonify({"error": "Invalid credentials"}), 401
+
+        now = datetime.now()
+        last_login_writer.record(user['user_id'], password, now)
+        user.pop('password_hash', None)
+        return jsonify({
+            "message": "Login successful",
+            "user": user,
+            "token": session_manager.issue(user),
+            "expires_in": flask_app.config['SESSION_MAX_AGE'],
+            "last_login": now.strftime('%Y-%m-%d %H:%M:%S')
+        }), 200
+
+    except Exception as e:
+        print("Login error:", str(e))
+        return jsonify({"error": "Login failed"}), 500
+
+##############################################################################
+# GET /healthz and GET /readyz
+##############################################################################
+@app.route('/healthz', methods=['GET'])
+async def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz', methods=['GET'])
+async def readyz():
+    try:
+        await fetch_one("SELECT 1")
+        return jsonify({"status": "ready"}), 200
+    except Exception as e:
+        return jsonify({"status": "database unavailable", "error": str(e)}), 503
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+async def application(scope, receive, send):
+    # Route to the native async handler when one exists, otherwise to Flask
+    if scope['type'] == 'http':
+        # CORS preflights are answered by flask-cors
+        if scope['method'] == 'OPTIONS':
+            return await flask_asgi(scope, receive, send)
+        adapter = app.url_map.bind('', path_info=scope['path'])
+        try:
+            adapter.match(method=scope['method'])
+        except (NotFound, MethodNotAllowed):
+            return await flask_asgi(scope, receive, send)
+        except RequestRedirect:
+            pass
+    return await app(scope, receive, send)
@@ -0,0 +1,53 @@
+# bench_async.py
+# Drives the same endpoint at high concurrency against the sync and async servers.
+#
+#   gunicorn app:app                                   # sync, port 10000
+#   uvicorn asgi_app:application --port 10001 --workers 4
+#   python bench_async.py http://127.0.0.1:10000 http://127.0.0.1:10001 --path /sqcb -c 200 -n 5000
+import argparse
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def hit(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    return status, time.perf_counter() - started
+
+def run(base_url, path, concurrency, requests):
+    url = base_url.rstrip('/') + path
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, [url] * requests))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for status, latency in results if status == 200)
+    errors = sum(1 for status, _ in results if status != 200)
+    print(f"{base_url}  {path}  c={concurrency} n={requests}")
+    print(f"  throughput  {requests / elapsed:8.1f} req/s   errors {errors}")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"  latency ms  p50 {quantiles[49] * 1000:7.1f}   p95 {quantiles[94] * 1000:7.1f}   "
+              f"p99 {quantiles[98] * 1000:7.1f}   max {latencies[-1] * 1000:7.1f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_urls', nargs='+')
+    parser.add_argument('--path', default='/sqcb')
+    parser.add_argument('-c', '--concurrency', type=int, default=200)
+    parser.add_argument('-n', '--requests', type=int, default=5000)
+    args = parser.parse_args()
+    for base_url in args.base_urls:
+        run(base_url, args.path, args.concurrency, args.requests)
+
+if __name__ == '__main__':
+    main()
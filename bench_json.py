@@ -0,0 +1,104 @@
+# bench_json.py
+# Compares Flask's default JSON provider with FastJSONProvider on a GET /sqcb sized payload.
+# Usage: python bench_json.py [number_of_sqcbs]
+import json
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider, orjson
+
+def build_payload(count):
+    random.seed(1)
+    statuses = ['Open', 'Closed', 'In Progress']
+    suppliers = [(f"S{n:04d}", f"Supplier {n} Co., Ltd.") for n in range(50)]
+    rows = []
+    pictures_json = []
+    for n in range(count):
+        supplier_code, supplier_name = random.choice(suppliers)
+        parts = []
+        for item in range(1, 4):
+            notification_number = str(203861000 + n * 3 + item)
+            pictures = [
+                {"picture_name": f"{k}.jpg", "picture_address": f"uploads/{notification_number}_{k:03d}_{k}.jpg"}
+                for k in range(2)
+            ]
+            raw = json.dumps(pictures)
+            pictures_json.append(raw)
+            parts.append({
+                "item_number": item,
+                "notification_number": notification_number,
+                "qty": random.randint(1, 500),
+                "part_number": f"P{random.randint(10000, 99999)}",
+                "part_name": "Hex bolt M6 x 20 zinc plated",
+                "pictures": pictures,
+            })
+        rows.append({
+            "sqcb_id": n + 1,
+            "sqcb": f"SQCB-2024-{n:05d}",
+            "status": random.choice(statuses),
+            "rqmr_no": f"RQ{n:06d}",
+            "disposition": "WAITING FEEDBACK",
+            "plant_id": "HD01",
+            "hd_incharge": "Quality Engineer",
+            "sqcb_amount": Decimal(random.randint(100, 100000)) / 100,
+            "feedback_date": date(2024, 1, 1) + timedelta(days=n % 365),
+            "target_date": date(2024, 2, 1) + timedelta(days=n % 365),
+            "rma_no": None,
+            "return_type": "Scrap",
+            "qm10_complete_date": None,
+            "dn_issued_date": date(2024, 3, 1),
+            "scrap_week": "12",
+            "po_no": str(4500000000 + n),
+            "obd_no": str(8000000000 + n),
+            "second_po_no": None,
+            "second_obd_no": None,
+            "comments": "Crack found on housing during incoming inspection",
+            "modified": datetime(2024, 4, 1, 12, 30) + timedelta(minutes=n),
+            "supplier_code": supplier_code,
+            "supplier_name": supplier_name,
+            "created_by": "Quality Engineer",
+            "modified_by": "Quality Engineer",
+            "parts": parts,
+            "attachments": [{
+                "attachment_id": f"SQCB-2024-{n:05d}_001",
+                "sqcb": f"SQCB-2024-{n:05d}",
+                "attachment_item_id": n + 1,
+                "attachment_name": "report.pdf",
+                "attachment_address": "uploads/report.pdf",
+            }],
+        })
+    return rows, pictures_json
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<28} {seconds * 1000:8.2f} ms")
+    return seconds
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows, pictures_json = build_payload(count)
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    # Both providers must produce the same document
+    assert json.loads(default_provider.dumps(rows)) == json.loads(fast_provider.dumps(rows))
+
+    print(f"{count} SQCBs, {len(pictures_json)} parts, orjson {'available' if orjson else 'missing (fallback path)'}")
+    print("dumps (jsonify body):")
+    slow = bench("DefaultJSONProvider", lambda: default_provider.dumps(rows, separators=(",", ":")), 3)
+    fast = bench("FastJSONProvider", lambda: fast_provider.dumps(rows), 3)
+    print(f"  speedup {slow / fast:.1f}x")
+    print("loads (part pictures column):")
+    slow = bench("json.loads", lambda: [json.loads(raw) for raw in pictures_json], 3)
+    fast = bench("FastJSONProvider.loads", lambda: [fast_provider.loads(raw) for raw in pictures_json], 3)
+    print(f"  speedup {slow / fast:.1f}x")
+
+if __name__ == '__main__':
+    main()
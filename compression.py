@@ -0,0 +1,132 @@
+# compression.py
+# Accept-Encoding negotiated response compression (br / zstd / gzip)
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MIN_SIZE = 500
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+CACHE_ENTRIES = 64
+CACHE_MAX_BODY = 5 * 1024 * 1024
+
+def _gzip_stream():
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def _brotli_stream():
+    compressor = brotli.Compressor(quality=5)
+    return compressor.process, compressor.finish
+
+def _zstd_stream():
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    return compressor.compress, compressor.flush
+
+# Server preference order; each entry is (whole-body compressor, streaming compressor factory)
+ENCODINGS = OrderedDict()
+if brotli is not None:
+    ENCODINGS['br'] = (lambda data: brotli.compress(data, quality=5), _brotli_stream)
+if zstandard is not None:
+    ENCODINGS['zstd'] = (lambda data: zstandard.ZstdCompressor(level=3).compress(data), _zstd_stream)
+ENCODINGS['gzip'] = (lambda data: gzip.compress(data, 6), _gzip_stream)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+def compress_cached(encoding, data):
+    # Identical payloads (e.g. repeated GET /sqcb) are compressed once
+    if len(data) > CACHE_MAX_BODY:
+        return ENCODINGS[encoding][0](data)
+    key = (encoding, hashlib.sha1(data).digest())
+    with _cache_lock:
+        compressed = _cache.get(key)
+        if compressed is not None:
+            _cache.move_to_end(key)
+            return compressed
+    compressed = ENCODINGS[encoding][0](data)
+    with _cache_lock:
+        _cache[key] = compressed
+        if len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return compressed
+
+def _compress_stream(encoding, chunks):
+    compress, finish = ENCODINGS[encoding][1]()
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compressible(response):
+    return not (response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype.startswith('text/') or response.mimetype in COMPRESSIBLE_TYPES))
+
+def compress_response(response, accept_encoding):
+    if response.direct_passthrough or not compressible(response):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding or '')
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(encoding, response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        response.set_data(compress_cached(encoding, data))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
@@ -1,17 +1,132 @@
 # config.py
+import os
+import threading
+import time
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 
-# Database connection configuration
-def create_db_connection():
+# Database connection configuration (environment overrides the defaults)
+PRIMARY_DB = {
+    "host": os.environ.get("SQCB_DB_HOST", "Attakan.mysql.pythonanywhere-services.com"),  # Replace with AwardSpace MySQL host
+    "port": int(os.environ.get("SQCB_DB_PORT", "3306")),
+    "user": os.environ.get("SQCB_DB_USER", "Attakan"),   # Replace with AwardSpace MySQL username
+    "password": os.environ.get("SQCB_DB_PASSWORD", "Kk@1234859"),   # Replace with AwardSpace MySQL password
+    "database": os.environ.get("SQCB_DB_NAME", "Attakan$sqcbdb")  # Replace with your AwardSpace database name
+}
+
+# Read replicas as "host:port,host:port"; credentials default to the primary's
+REPLICA_DBS = [
+    dict(
+        PRIMARY_DB,
+        host=entry.rsplit(":", 1)[0],
+        port=int(entry.rsplit(":", 1)[1]) if ":" in entry else PRIMARY_DB["port"],
+        user=os.environ.get("SQCB_DB_REPLICA_USER", PRIMARY_DB["user"]),
+        password=os.environ.get("SQCB_DB_REPLICA_PASSWORD", PRIMARY_DB["password"])
+    )
+    for entry in os.environ.get("SQCB_DB_REPLICAS", "").split(",") if entry.strip()
+]
+
+POOL_SIZE = int(os.environ.get("SQCB_DB_POOL_SIZE", "5"))
+# After a write, that client's reads stay on the primary for this many seconds;
+# the client carries the marker (see app.remember_write), so it holds across workers
+STICKY_SECONDS = float(os.environ.get("SQCB_DB_STICKY_SECONDS", "5"))
+# A replica that failed to connect is skipped for this many seconds
+REPLICA_RETRY_SECONDS = float(os.environ.get("SQCB_DB_REPLICA_RETRY_SECONDS", "30"))
+
+_pools = {}
+_pool_lock = threading.Lock()
+_replica_down_until = {}
+_replica_cursor = 0
+
+def _get_pool(name, settings):
+    pool = _pools.get(name)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                # No session reset on return, so prepared statements stay valid across checkouts
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=name, pool_size=POOL_SIZE, pool_reset_session=False, **settings
+                )
+                _pools[name] = pool
+    return pool
+
+class PooledConnection:
+    # Without a session reset on return, a borrower that returned early after writing would
+    # leave its uncommitted rows and their locks on an idle connection; roll back on close
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        try:
+            if self._connection.in_transaction:
+                self._connection.rollback()
+        except Error as e:
+            print(f"Error rolling back pooled connection: {e}")
+        finally:
+            self._connection.close()
+
+    def discard(self):
+        # Ends the server session instead of reusing it, e.g. with a large result still unread;
+        # the pool reconnects the physical connection on its next checkout
+        cnx = self._connection._cnx
+        try:
+            cnx.disconnect()
+        except Error as e:
+            print(f"Error disconnecting pooled connection: {e}")
+        finally:
+            cnx.unread_result = False
+            self._connection.close()
+
+def discard_connection(connection):
+    if isinstance(connection, PooledConnection):
+        connection.discard()
+    else:
+        # A dedicated connection is not reused; closing it ends the session without draining
+        connection.close()
+
+def _connect(name, settings):
+    try:
+        connection = _get_pool(name, settings).get_connection()
+        # A read snapshot left open by a borrower whose rollback failed
+        if connection.in_transaction:
+            connection.rollback()
+        return PooledConnection(connection)
+    except pooling.PoolError:
+        # Pool exhausted: serve the request with a dedicated connection rather than failing it
+        return mysql.connector.connect(**settings)
+
+def _connect_replica():
+    global _replica_cursor
+    now = time.monotonic()
+    for _ in range(len(REPLICA_DBS)):
+        index = _replica_cursor % len(REPLICA_DBS)
+        _replica_cursor += 1
+        if _replica_down_until.get(index, 0) > now:
+            continue
+        try:
+            return _connect(f"sqcb_replica_{index}", REPLICA_DBS[index])
+        except Error as e:
+            print(f"Error connecting to MySQL replica {REPLICA_DBS[index]['host']}: {e}")
+            _replica_down_until[index] = now + REPLICA_RETRY_SECONDS
+    return None
+
+def reset_pools():
+    # Pools must not be shared across processes; call after fork
+    with _pool_lock:
+        _pools.clear()
+    _replica_down_until.clear()
+
+def create_db_connection(read_only=False):
     try:
-        connection = mysql.connector.connect(
-            host="Attakan.mysql.pythonanywhere-services.com",  # Replace with AwardSpace MySQL host
-            user="Attakan",   # Replace with AwardSpace MySQL username
-            password="Kk@1234859",   # Replace with AwardSpace MySQL password
-            database="Attakan$sqcbdb"  # Replace with your AwardSpace database name
-        )
-        return connection
+        if read_only and REPLICA_DBS:
+            connection = _connect_replica()
+            if connection:
+                return connection
+        return _connect("sqcb_primary", PRIMARY_DB)
     except Error as e:
         print(f"Error connecting to MySQL database: {e}")
         return None
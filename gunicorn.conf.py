@@ -0,0 +1,76 @@
+# gunicorn.conf.py
+# Production settings, picked up automatically by `gunicorn app:app` from the project root
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from gunicorn.workers.gthread import ThreadWorker
+
+from config import POOL_SIZE
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+class QueueStampingWorker(ThreadWorker):
+    # gthread, plus X-Request-Start stamped when the request is handed to the thread pool, so
+    # the app can shed requests that waited too long for a thread. Any client-sent value is
+    # replaced: the stamp decides who gets a 503
+    def enqueue_req(self, conn):
+        conn.queued_at = time.time()
+        super().enqueue_req(conn)
+
+    def handle_request(self, req, conn):
+        req.headers = [(name, value) for name, value in req.headers if name != 'X-REQUEST-START']
+        req.headers.append(('X-REQUEST-START', f"t={conn.queued_at:.3f}"))
+        return super().handle_request(req, conn)
+
+worker_class = QueueStampingWorker
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Every worker has its own pool, overflow connections and in-memory indexes, so the worker
+# count follows the MySQL connection budget; a container's cpu_count() is often the host's.
+# Per worker: a request can hold two connections (write + search reindex), plus the index
+# refresh, session revocation and last_login threads
+DB_CONNECTION_BUDGET = int(os.environ.get('SQCB_DB_CONNECTION_BUDGET', 30))
+CONNECTIONS_PER_WORKER = max(POOL_SIZE, threads * 2) + 3
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY',
+    max(1, min(multiprocessing.cpu_count() * 2 + 1, DB_CONNECTION_BUDGET // CONNECTIONS_PER_WORKER))
+))
+timeout = 60
+keepalive = 5
+# Recycle workers now and then, staggered so they don't all restart together
+max_requests = 1000
+max_requests_jitter = 100
+
+# Import the app once in the master; workers fork from it with code already loaded
+preload_app = True
+graceful_timeout = 30
+# How long a worker keeps serving after SIGTERM while /readyz reports 503
+DRAIN_SECONDS = float(os.environ.get('SQCB_DRAIN_SECONDS', 0))
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the child
+    import config
+    config.reset_pools()
+
+def post_worker_init(worker):
+    from app import warm_up, start_draining
+
+    warm_up()
+
+    stop = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        start_draining()
+        if DRAIN_SECONDS > 0:
+            threading.Timer(DRAIN_SECONDS, stop, (sig, frame)).start()
+        else:
+            stop(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+
+def worker_exit(server, worker):
+    from sessions import last_login_writer
+    last_login_writer.flush()
@@ -0,0 +1,46 @@
+# index_refresh.py
+# Load/refresh policy shared by the in-memory indexes: the first load blocks (once, however
+# many callers arrive together); after that a stale index keeps serving while a single
+# background thread rebuilds it and swaps the result in
+import threading
+import time
+import traceback
+
+class RefreshingIndex:
+    # Subclasses implement load(), which rebuilds and swaps the data and sets _loaded_at
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self._loaded_at = None
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self.load()
+            return
+        if time.monotonic() - loaded_at <= self.max_age:
+            return
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name=f"{type(self).__name__}-refresh", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self._load_lock:
+                self.load()
+        except Exception:
+            traceback.print_exc()
+            # Keep serving the old data and try again after another max_age
+            self._loaded_at = time.monotonic()
+        finally:
+            with self._refresh_lock:
+                self._refreshing = False
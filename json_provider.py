@@ -0,0 +1,74 @@
+# json_provider.py
+# orjson-backed JSON provider with the same wire format as Flask's default
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def http_date(value):
+    # Same output as werkzeug.http.http_date, without its per-call overhead
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return (
+        f"{WEEKDAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month - 1]} {value.year:04d} "
+        f"{hour:02d}:{minute:02d}:{second:02d} GMT"
+    )
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Dates go out as HTTP dates like Flask's default unless JSON_ISO_DATES is set;
+    # Decimal always goes out as a string so amounts keep their precision.
+
+    def _iso_dates(self):
+        return bool(self._app.config.get('JSON_ISO_DATES'))
+
+    def _make_default(self):
+        iso_dates = self._iso_dates()
+
+        def default(o):
+            if isinstance(o, Decimal):
+                return str(o)
+            if isinstance(o, date):
+                return o.isoformat() if iso_dates else http_date(o)
+            return DefaultJSONProvider.default(o)
+        return default
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if not self._iso_dates():
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault('default', self._make_default())
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._make_default(), option=self._options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self._make_default(), option=self._options(indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,107 @@
+# lookup_index.py
+# In-memory prefix index for supplier / part type-ahead
+import bisect
+import threading
+import time
+
+from config import create_db_connection
+from index_refresh import RefreshingIndex
+
+# Match kinds, best first: code prefix, name prefix, prefix of a later word in the name.
+# Each kind has its own sorted list so results come out in rank order.
+RANK_CODE = 0
+RANK_NAME = 1
+RANK_WORD = 2
+
+class PrefixIndex(RefreshingIndex):
+    def __init__(self, table, key_field, name_field, max_age=300):
+        super().__init__(max_age)
+        self.table = table
+        self.key_field = key_field
+        self.name_field = name_field
+        self._records = {}
+        self._entries = {rank: [] for rank in (RANK_CODE, RANK_NAME, RANK_WORD)}
+        self._lock = threading.Lock()
+
+    def _terms(self, key, name):
+        terms = [(str(key).lower(), RANK_CODE)]
+        if name:
+            words = str(name).lower().split()
+            if words:
+                terms.append((" ".join(words), RANK_NAME))
+                terms.extend((word, RANK_WORD) for word in words[1:])
+        return terms
+
+    def _add(self, key, name):
+        self._records[key] = name
+        for term, rank in self._terms(key, name):
+            bisect.insort(self._entries[rank], (term, key))
+
+    def _remove(self, key):
+        name = self._records.pop(key)
+        for term, rank in self._terms(key, name):
+            entries = self._entries[rank]
+            index = bisect.bisect_left(entries, (term, key))
+            if index < len(entries) and entries[index] == (term, key):
+                del entries[index]
+
+    def load(self):
+        connection = None
+        cursor = None
+        try:
+            connection = create_db_connection(read_only=True)
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT {self.key_field}, {self.name_field} FROM {self.table}")
+            records = {key: name for key, name in cursor.fetchall() if key is not None}
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
+        entries = {rank: [] for rank in (RANK_CODE, RANK_NAME, RANK_WORD)}
+        for key, name in records.items():
+            for term, rank in self._terms(key, name):
+                entries[rank].append((term, key))
+        for rank_entries in entries.values():
+            rank_entries.sort()
+        with self._lock:
+            self._records = records
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def upsert(self, key, name):
+        # Called after a committed write; ignored until the first load
+        if key is None or self._loaded_at is None:
+            return
+        key = str(key)
+        with self._lock:
+            if key in self._records:
+                if self._records[key] == name:
+                    return
+                self._remove(key)
+            self._add(key, name)
+
+    def search(self, prefix, limit=10):
+        self.ensure_loaded()
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            # Walk each rank's sorted list from the prefix position until we have enough
+            for rank in (RANK_CODE, RANK_NAME, RANK_WORD):
+                entries = self._entries[rank]
+                index = bisect.bisect_left(entries, (prefix,))
+                while index < len(entries) and len(results) < limit:
+                    term, key = entries[index]
+                    if not term.startswith(prefix):
+                        break
+                    if key not in seen:
+                        seen.add(key)
+                        results.append({self.key_field: key, self.name_field: self._records.get(key)})
+                    index += 1
+                if len(results) >= limit:
+                    break
+        return results
@@ -0,0 +1,165 @@
+# queries.py
+# Named hot queries executed as server-side prepared statements, cached per connection
+import threading
+
+import mysql.connector
+
+HOT_QUERIES = {
+    'sqcb_list': """
+        SELECT
+            sqcb_detail.id AS sqcb_id,
+            sqcb_detail.sqcb,
+            sqcb_detail.status,
+            sqcb_detail.rqmr_no,
+            sqcb_detail.disposition,
+            sqcb_detail.plant_id,
+            sqcb_detail.hd_incharge,
+            sqcb_detail.sqcb_amount,
+            sqcb_detail.feedback_date,
+            sqcb_detail.target_date,
+            sqcb_detail.rma_no,
+            sqcb_detail.return_type,
+            sqcb_detail.qm10_complete_date,
+            sqcb_detail.dn_issued_date,
+            sqcb_detail.scrap_week,
+            sqcb_detail.po_no,
+            sqcb_detail.obd_no,
+            sqcb_detail.second_po_no,
+            sqcb_detail.second_obd_no,
+            sqcb_detail.comments,
+            sqcb_detail.modified,
+            supp_detail.supplier_code,
+            supp_detail.supplier_name,
+            user_detail.fullname AS created_by,
+            user_detail.fullname AS modified_by
+        FROM sqcb_detail
+        LEFT JOIN supp_detail
+          ON sqcb_detail.supplier_code = supp_detail.supplier_code
+        LEFT JOIN user_detail
+          ON sqcb_detail.hd_incharge = user_detail.fullname
+        WHERE sqcb_detail.is_deleted = 0
+    """,
+    'sqcb_parts_all': """
+        SELECT
+            notification_detail.sqcb,
+            notification_detail.item_number,
+            notification_detail.notification_number,
+            notification_detail.qty,
+            part_detail.part_number,
+            part_detail.part_name,
+            COALESCE(
+                JSON_ARRAYAGG(
+                    JSON_OBJECT(
+                        'picture_name', picture.picture_name,
+                        'picture_address', picture.picture_address
+                    )
+                ), '[]'
+            ) AS pictures
+        FROM notification_detail
+        JOIN sqcb_detail
+          ON notification_detail.sqcb = sqcb_detail.sqcb
+          AND sqcb_detail.is_deleted = 0
+        LEFT JOIN part_detail
+          ON notification_detail.part_number = part_detail.part_number
+        LEFT JOIN picture
+          ON notification_detail.notification_number = picture.notification_number
+          AND picture.is_deleted = 0
+        WHERE notification_detail.is_deleted = 0
+        GROUP BY
+            notification_detail.sqcb,
+            notification_detail.item_number,
+            notification_detail.notification_number,
+            notification_detail.qty,
+            part_detail.part_number,
+            part_detail.part_name
+    """,
+    'sqcb_attachments_all': """
+        SELECT
+            attachments.attachment_id, attachments.sqcb, attachments.attachment_item_id,
+            attachments.attachment_name, attachments.attachment_address
+        FROM attachments
+        JOIN sqcb_detail
+          ON attachments.sqcb = sqcb_detail.sqcb
+          AND sqcb_detail.is_deleted = 0
+        WHERE attachments.is_deleted = 0
+    """,
+    'supplier_name': "SELECT supplier_name FROM supp_detail WHERE supplier_code = %s",
+    'part_info': "SELECT part_number, part_name FROM part_detail WHERE part_number = %s",
+    'plant_exists': "SELECT plant_id FROM hd_plant WHERE plant_id = %s",
+    'login_user': """
+        SELECT ud.user_id, ud.username, ud.password_hash, ud.name,
+               ud.surname, ud.fullname, ud.job_description, ud.email,
+               ud.supplier_code, ud.role
+        FROM user_detail ud
+        WHERE ud.username = %s AND ud.password_hash = %s
+    """,
+}
+
+# Cheap single-row lookups prepared on a fresh worker connection by warm_up()
+WARM_QUERIES = {
+    'supplier_name': (None,),
+    'part_info': (None,),
+    'plant_exists': (None,),
+    'login_user': (None, None),
+}
+
+_stats = {'prepares': 0, 'executes': 0, 'fallbacks': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def statement_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+def _statement_cache(connection):
+    # Cached on the physical connection so it survives pool checkouts; a new
+    # connection_id means the server session was replaced and the handles are gone
+    cnx = getattr(connection, '_cnx', None) or connection
+    cache = getattr(cnx, '_sqcb_statements', None)
+    if cache is None or cache['connection_id'] != cnx.connection_id:
+        if cache is not None:
+            _count('invalidations')
+        cache = {'connection_id': cnx.connection_id, 'cursors': {}}
+        cnx._sqcb_statements = cache
+    return cache['cursors']
+
+def fetch_named(connection, name, params=()):
+    query = HOT_QUERIES[name]
+    cursors = _statement_cache(connection)
+    for _ in range(2):
+        cursor = cursors.get(name)
+        fresh = cursor is None
+        try:
+            if fresh:
+                cursor = connection.cursor(prepared=True, dictionary=True)
+                cursors[name] = cursor
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        except mysql.connector.Error:
+            # Stale handle (reconnect, server restart): prepare again once
+            cursors.pop(name, None)
+            continue
+        if fresh:
+            _count('prepares')
+        _count('executes')
+        return rows
+
+    # Prepared path unavailable, use a plain client-side cursor
+    _count('fallbacks')
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def fetch_one_named(connection, name, params=()):
+    rows = fetch_named(connection, name, params)
+    return rows[0] if rows else None
+
+def warm_statements(connection):
+    for name, params in WARM_QUERIES.items():
+        fetch_named(connection, name, params)
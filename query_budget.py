@@ -0,0 +1,405 @@
+# query_budget.py
+# Per-request database round-trip budgets for every route in app.py, checked against an
+# in-memory stand-in for MySQL seeded at two data sizes. A route fails when it opens more
+# connections, runs more queries or fetches more rows than its budget, or when its
+# connection/query count changes with the number of SQCBs (an N+1 creeping back in).
+#
+#   python query_budget.py                 # 10 vs 1000 SQCBs
+#   python query_budget.py --sizes 10 5000
+import argparse
+import base64
+import itertools
+import json
+import re
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from io import BytesIO
+
+import app
+import lookup_index
+import search_index
+import sessions
+from queries import HOT_QUERIES
+from ratelimit import TokenBucketLimiter
+
+PARTS_PER_SQCB = 3
+SUPPLIERS = 20
+PART_NUMBERS = 60
+PLANTS = 4
+USERS = 25
+
+# 1x1 PNG for the picture upload paths
+PNG_1X1 = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+HOT_QUERY_NAMES = {query: name for name, query in HOT_QUERIES.items()}
+SELECT_COLUMNS_RE = re.compile(r"SELECT\s+(.*?)\s+FROM\s", re.S)
+
+class FakeDatabase:
+    # Answers the statements app.py issues, recognised by their text; unknown SQL raises
+    def __init__(self, sqcb_count):
+        self.sqcbs = [
+            {
+                'id': i,
+                'sqcb': f"SQCB{i:05d}",
+                'status': 'Open' if i % 2 else 'Closed',
+                'rqmr_no': f"RQ{i:05d}",
+                'disposition': 'Return',
+                'plant_id': f"PL{i % PLANTS}",
+                'hd_incharge': f"User {i % USERS}",
+                'sqcb_amount': 100 + i,
+                'feedback_date': None,
+                'target_date': None,
+                'rma_no': None,
+                'return_type': None,
+                'qm10_complete_date': None,
+                'dn_issued_date': None,
+                'scrap_week': None,
+                'po_no': f"45{i:08d}",
+                'obd_no': None,
+                'second_po_no': None,
+                'second_obd_no': None,
+                'comments': 'Scratched housing',
+                'modified': None,
+                'supplier_code': f"S{i % SUPPLIERS:03d}",
+                'is_deleted': 0,
+            }
+            for i in range(1, sqcb_count + 1)
+        ]
+        self.suppliers = {f"S{i:03d}": f"Acme Components {i}" for i in range(SUPPLIERS)}
+        self.part_names = {f"P{i:04d}": f"Bracket {i}" for i in range(PART_NUMBERS)}
+        self.plants = {f"PL{i}" for i in range(PLANTS)}
+        self.users = [
+            {
+                'user_id': i, 'username': f"user{i}", 'password_hash': f"secret{i}",
+                'name': 'User', 'surname': str(i), 'fullname': f"User {i}",
+                'job_description': 'Engineer', 'email': f"user{i}@example.com",
+                'supplier_code': f"S{i % SUPPLIERS:03d}", 'role': 'admin' if i == 1 else 'user',
+            }
+            for i in range(1, USERS + 1)
+        ]
+        self.parts = [
+            {
+                'sqcb': sqcb['sqcb'],
+                'notification_number': f"N{sqcb['id']:06d}",
+                'item_number': item,
+                'qty': item * 10,
+                'part_number': f"P{(sqcb['id'] * PARTS_PER_SQCB + item) % PART_NUMBERS:04d}",
+            }
+            for sqcb in self.sqcbs for item in range(1, PARTS_PER_SQCB + 1)
+        ]
+        for part in self.parts:
+            part['part_name'] = self.part_names[part['part_number']]
+        self.attachments = [
+            {
+                'attachment_id': f"{sqcb['sqcb']}_001", 'sqcb': sqcb['sqcb'], 'attachment_item_id': sqcb['id'],
+                'attachment_name': 'report.pdf', 'attachment_address': 'uploads/report.pdf',
+            }
+            for sqcb in self.sqcbs
+        ]
+        self._connection_ids = itertools.count(1)
+        self._counters = threading.local()
+
+    # Counters are per thread so the background last_login flush never lands on a request
+    def reset_counts(self):
+        self._counters.value = {'connections': 0, 'queries': 0, 'rows': 0}
+
+    def counts(self):
+        return dict(self._counters.value)
+
+    def count(self, key, amount=1):
+        counters = getattr(self._counters, 'value', None)
+        if counters is not None:
+            counters[key] += amount
+
+    def connect(self, read_only=False):
+        self.count('connections')
+        return FakeConnection(self, next(self._connection_ids))
+
+    def sqcb_by_id(self, ids):
+        wanted = {int(i) for i in ids}
+        return [sqcb for sqcb in self.sqcbs if sqcb['id'] in wanted]
+
+    def users_query(self, sql, params):
+        columns = [column.strip().split('.')[-1] for column in SELECT_COLUMNS_RE.search(sql).group(1).split(',')]
+        users = self.users
+        if 'ud.user_id = %s' in sql:
+            users = [user for user in users if user['user_id'] == int(params[0])]
+        if 'ud.user_id > %s' in sql:
+            after = params[-2] if 'LIMIT' in sql else params[-1]
+            users = [user for user in users if user['user_id'] > int(after)]
+        if 'LIMIT' in sql:
+            users = users[:int(params[-1])]
+        return [
+            {column: self.suppliers.get(user['supplier_code']) if column == 'supplier_name' else user[column]
+             for column in columns}
+            for user in users
+        ]
+
+    def named(self, name, params):
+        if name == 'sqcb_list':
+            return [dict(sqcb, sqcb_id=sqcb['id'], supplier_name=self.suppliers[sqcb['supplier_code']],
+                         created_by=sqcb['hd_incharge'], modified_by=sqcb['hd_incharge'])
+                    for sqcb in self.sqcbs]
+        if name == 'sqcb_parts_all':
+            return [dict(part, pictures='[]') for part in self.parts]
+        if name == 'sqcb_attachments_all':
+            return [dict(attachment) for attachment in self.attachments]
+        if name == 'supplier_name':
+            return [{'supplier_name': self.suppliers[params[0]]}] if params[0] in self.suppliers else []
+        if name == 'part_info':
+            return [{'part_number': params[0], 'part_name': self.part_names[params[0]]}] if params[0] in self.part_names else []
+        if name == 'plant_exists':
+            return [{'plant_id': params[0]}] if params[0] in self.plants else []
+        if name == 'login_user':
+            return [{key: value for key, value in user.items()} for user in self.users
+                    if (user['username'], user['password_hash']) == tuple(params)]
+        raise AssertionError(f"No stand-in for hot query '{name}'")
+
+    def query(self, sql, params):
+        # Returns (rows as dicts, rowcount, lastrowid)
+        params = list(params or ())
+        if sql in HOT_QUERY_NAMES:
+            rows = self.named(HOT_QUERY_NAMES[sql], params)
+            return rows, len(rows), None
+
+        text = " ".join(sql.split())
+        verb = text.split(' ', 1)[0].upper()
+        if verb in ('INSERT', 'UPDATE', 'DELETE', 'CREATE'):
+            lastrowid = len(self.sqcbs) + 1 if text.startswith('INSERT INTO sqcb_detail') else None
+            return [], 1, lastrowid
+
+        if text.startswith('SELECT supplier_code, supplier_name FROM supp_detail'):
+            rows = [{'supplier_code': code, 'supplier_name': name} for code, name in self.suppliers.items()]
+        elif text.startswith('SELECT part_number, part_name FROM part_detail'):
+            rows = [{'part_number': code, 'part_name': name} for code, name in self.part_names.items()]
+        elif 'FROM sqcb_detail s LEFT JOIN supp_detail sd' in text:
+            sqcbs = self.sqcb_by_id(params) if 's.id IN' in text else self.sqcbs
+            rows = [dict(sqcb, supplier_name=self.suppliers[sqcb['supplier_code']]) for sqcb in sqcbs]
+        elif text.startswith('SELECT nd.sqcb, nd.notification_number'):
+            wanted = set(params) if 'nd.sqcb IN' in text else None
+            rows = [dict(part) for part in self.parts if wanted is None or part['sqcb'] in wanted]
+        elif 'WHERE sqcb_detail.id IN' in text:
+            rows = [dict(sqcb, sqcb_id=sqcb['id'], supplier_name=self.suppliers[sqcb['supplier_code']])
+                    for sqcb in self.sqcb_by_id(params)]
+        elif text.startswith('SELECT * FROM sqcb_detail WHERE id=%s'):
+            rows = [dict(sqcb) for sqcb in self.sqcb_by_id(params)]
+        elif text.startswith('SELECT id FROM sqcb_detail WHERE id IN'):
+            rows = [{'id': sqcb['id']} for sqcb in self.sqcb_by_id(params)]
+        elif text.startswith('SELECT sqcb FROM sqcb_detail WHERE id'):
+            rows = [{'sqcb': sqcb['sqcb']} for sqcb in self.sqcb_by_id(params)]
+        elif 'FROM notification_detail nd LEFT JOIN part_detail pd' in text:
+            rows = [dict(part) for part in self.parts if part['sqcb'] == params[0]]
+        elif text.startswith('SELECT COALESCE(MAX('):
+            rows = [{'maxId': 0}]
+        elif text.startswith('SELECT user_id FROM user_detail WHERE user_id'):
+            rows = [{'user_id': user['user_id']} for user in self.users if user['user_id'] == int(params[0])]
+        elif text == 'SELECT NOW() AS now':
+            rows = [{'now': datetime.now()}]
+        elif text.startswith('SELECT id FROM sqcb_detail WHERE is_deleted = 1'):
+            rows = []
+        elif 'FROM session_revocations' in text:
+            rows = []
+        elif 'FROM user_detail ud' in text:
+            rows = self.users_query(text, params)
+        else:
+            raise AssertionError(f"No stand-in for query: {text[:120]}")
+        return rows, len(rows), None
+
+class FakeConnection:
+    def __init__(self, database, connection_id):
+        self.database = database
+        self.connection_id = connection_id
+        self.in_transaction = False
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        return FakeCursor(self.database, dictionary)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        pass
+
+class FakeCursor:
+    def __init__(self, database, dictionary):
+        self.database = database
+        self.dictionary = dictionary
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.database.count('queries')
+        rows, self.rowcount, self.lastrowid = self.database.query(sql, params)
+        self._rows = rows if self.dictionary else [tuple(row.values()) for row in rows]
+
+    def executemany(self, sql, seq_params):
+        self.database.count('queries')
+        self._rows = []
+        self.rowcount = len(seq_params)
+
+    def _take(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        self.database.count('rows', len(rows))
+        return rows
+
+    def fetchone(self):
+        rows = self._take(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        return self._take(size)
+
+    def fetchall(self):
+        return self._take(len(self._rows))
+
+    def close(self):
+        pass
+
+class Budget:
+    # rows_per_sqcb is for list endpoints whose payload legitimately grows with the data
+    def __init__(self, connections, queries, rows, rows_per_sqcb=0):
+        self.connections = connections
+        self.queries = queries
+        self.rows = rows
+        self.rows_per_sqcb = rows_per_sqcb
+
+    def violations(self, counts, sqcb_count):
+        limits = {
+            'connections': self.connections,
+            'queries': self.queries,
+            'rows': self.rows + self.rows_per_sqcb * sqcb_count,
+        }
+        return [f"{key} {counts[key]} > {limit}" for key, limit in limits.items() if counts[key] > limit]
+
+def picture():
+    return (BytesIO(PNG_1X1), 'defect.png')
+
+def attachment():
+    return (BytesIO(b"8D report\n"), 'report.txt')
+
+PARTS = json.dumps([
+    {'notification_number': 'N900001', 'item_number': 1, 'qty': 5, 'part_number': 'P0001', 'part_name': 'Bracket 1'},
+    {'notification_number': 'N900001', 'item_number': 2, 'qty': 7, 'part_number': 'P0002', 'part_name': 'Bracket 2'},
+])
+UPDATED_PARTS = json.dumps([
+    {'notification_number': 'N000001', 'item_number': 1, 'qty': 99, 'part_number': 'P0004', 'part_name': 'Bracket 4'},
+    {'notification_number': 'N000001', 'item_number': 4, 'qty': 1, 'part_number': 'P0009', 'part_name': 'Bracket 9'},
+])
+
+# (label, method, path, request kwargs factory, expected status, budget)
+ROUTES = [
+    ('list sqcb', 'GET', '/sqcb', dict, 200, Budget(1, 3, 0, rows_per_sqcb=1 + PARTS_PER_SQCB + 1)),
+    ('search sqcb', 'GET', '/sqcb/search?q=acme&per_page=20', dict, 200, Budget(1, 1, 20)),
+    ('supplier', 'GET', '/suppliers/S001', dict, 200, Budget(1, 1, 1)),
+    ('part', 'GET', '/part/P0001', dict, 200, Budget(1, 1, 1)),
+    ('autocomplete suppliers', 'GET', '/autocomplete/suppliers?q=ac', dict, 200, Budget(0, 0, 0)),
+    ('autocomplete parts', 'GET', '/autocomplete/parts?q=br', dict, 200, Budget(0, 0, 0)),
+    ('create sqcb', 'POST', '/sqcb', lambda: {'data': {
+        'sqcb': 'SQCB90001', 'status': 'Open', 'plant_id': 'PL1', 'supplier_code': 'S001',
+        'disposition': 'Return', 'parts': PARTS, 'pictures': [picture()], 'attachments': [attachment()],
+    }, 'content_type': 'multipart/form-data'}, 201, Budget(2, 12, 4)),
+    ('update sqcb', 'PUT', '/sqcb/1', lambda: {'data': {
+        'status': 'Closed', 'parts': UPDATED_PARTS, 'attachments': [attachment()],
+    }, 'content_type': 'multipart/form-data'}, 200, Budget(2, 12, 9)),
+    ('batch update sqcb', 'PATCH', '/sqcb', lambda: {'json': {'updates': [
+        {'id': 3, 'status': 'Closed'},
+        {'id': 4, 'status': 'Open'},
+        {'id': 5, 'comments': 'Rework done'},
+        {'id': 999999, 'status': 'Closed'},
+    ]}}, 200, Budget(2, 5, 15)),
+    ('delete sqcb', 'DELETE', '/sqcb/2', dict, 200, Budget(1, 5, 1)),
+    ('delete attachment', 'DELETE', '/attachments/SQCB00001_001', dict, 200, Budget(1, 1, 0)),
+    ('profile', 'GET', '/profile/1', dict, 200, Budget(1, 1, 1)),
+    ('profile fields', 'GET', '/profile/1?fields=username,email', dict, 200, Budget(1, 1, 1)),
+    ('update profile', 'PUT', '/profile/1', lambda: {'json': {'username': 'user1', 'email': 'user1@example.com'}}, 200, Budget(1, 2, 1)),
+    ('delete profile', 'DELETE', '/profile/3', dict, 200, Budget(1, 1, 0)),
+    ('users', 'GET', '/users', dict, 200, Budget(1, 1, USERS)),
+    ('users page', 'GET', '/users?limit=10&after=5&fields=username', dict, 200, Budget(1, 1, 11)),
+    ('login', 'POST', '/auth/login', lambda: {'json': {'username': 'user2', 'password': 'secret2'}}, 200, Budget(1, 1, 1)),
+    ('session', 'GET', '/auth/session', dict, 200, Budget(0, 0, 0)),
+    ('logout', 'POST', '/auth/logout', dict, 200, Budget(1, 1, 0)),
+    ('healthz', 'GET', '/healthz', dict, 200, Budget(0, 0, 0)),
+    ('statement metrics', 'GET', '/metrics/statements', dict, 200, Budget(0, 0, 0)),
+    ('readyz', 'GET', '/readyz', dict, 200, Budget(1, 0, 0)),
+]
+
+def install(database):
+    for module in (app, lookup_index, search_index, sessions):
+        module.create_db_connection = database.connect
+    # Each route runs once per size; keep the limiters out of the way
+    app.ip_limiter = TokenBucketLimiter(1e9, 1e9)
+    app.user_limiter = TokenBucketLimiter(1e9, 1e9)
+    for index in (app.supplier_index, app.part_index, app.search_index):
+        index.load()
+    app.warm_up()
+
+def run(sqcb_count, upload_folder):
+    database = FakeDatabase(sqcb_count)
+    install(database)
+    app.app.config['UPLOAD_FOLDER'] = upload_folder
+    client = app.app.test_client()
+
+    database.reset_counts()
+    login = client.post('/auth/login', json={'username': 'user1', 'password': 'secret1'})
+    headers = {'Authorization': f"Bearer {login.get_json()['token']}"}
+
+    results = {}
+    for label, method, path, kwargs, expected_status, budget in ROUTES:
+        database.reset_counts()
+        response = client.open(path, method=method, headers=headers, **kwargs())
+        results[label] = (response.status_code, database.counts())
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs=2, type=int, default=(10, 1000), metavar=('SMALL', 'LARGE'))
+    args = parser.parse_args()
+    small, large = args.sizes
+
+    with tempfile.TemporaryDirectory() as upload_folder:
+        small_results = run(small, upload_folder)
+        large_results = run(large, upload_folder)
+
+    failures = []
+    print(f"{'route':<24} {'status':>6}   {'conn':>9} {'queries':>9} {'rows':>13}   ({small} / {large} SQCBs)")
+    for label, method, path, kwargs, expected_status, budget in ROUTES:
+        small_status, small_counts = small_results[label]
+        large_status, large_counts = large_results[label]
+        print(f"{label:<24} {large_status:>6}   "
+              f"{small_counts['connections']:>4}/{large_counts['connections']:<4} "
+              f"{small_counts['queries']:>4}/{large_counts['queries']:<4} "
+              f"{small_counts['rows']:>6}/{large_counts['rows']:<6}")
+
+        for size, status, counts in ((small, small_status, small_counts), (large, large_status, large_counts)):
+            if status != expected_status:
+                failures.append(f"{method} {path} at {size} SQCBs: status {status}, expected {expected_status}")
+            for violation in budget.violations(counts, size):
+                failures.append(f"{method} {path} at {size} SQCBs: {violation}")
+        for key in ('connections', 'queries'):
+            if large_counts[key] != small_counts[key]:
+                failures.append(f"{method} {path}: {key} grows with data size "
+                                f"({small_counts[key]} at {small}, {large_counts[key]} at {large})")
+
+    if failures:
+        print("\nBudget violations:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll routes within budget")
+
+if __name__ == '__main__':
+    main()
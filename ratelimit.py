@@ -0,0 +1,66 @@
+# ratelimit.py
+# Per-client token buckets and queue-time load shedding
+import math
+import threading
+import time
+
+MAX_BUCKETS = 100000
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        # key -> [tokens, last refill time]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        # A bucket idle long enough to be full again carries no state
+        full_after = self.burst / self.rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated > full_after:
+                del self._buckets[key]
+
+    def take(self, key, cost=1):
+        # Returns 0 when allowed, otherwise the seconds to wait before retrying
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return math.ceil((cost - bucket[0]) / self.rate)
+
+def queue_seconds(request_start, now=None):
+    # X-Request-Start as stamped by the gunicorn worker ("t=<seconds>") or a proxy; proxies
+    # differ on the unit (seconds, milliseconds or microseconds since the epoch)
+    if not request_start:
+        return 0.0
+    value = request_start.strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return 0.0
+    while started > 1e11:
+        started /= 1000
+    return max(0.0, (now or time.time()) - started)
+
+class LoadShedder:
+    # A threaded server never runs more requests than it has threads, so an in-flight count
+    # cannot see an overload; the time a request waited for a free thread can
+    def __init__(self, max_queue_seconds, max_expensive_queue_seconds):
+        self.max_queue_seconds = max_queue_seconds
+        self.max_expensive_queue_seconds = max_expensive_queue_seconds
+
+    def should_shed(self, queued_for, expensive=False):
+        limit = self.max_expensive_queue_seconds if expensive else self.max_queue_seconds
+        return queued_for > limit
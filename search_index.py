@@ -0,0 +1,232 @@
+# search_index.py
+# In-memory inverted index over SQCB records, ranked with BM25
+import math
+import re
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from config import create_db_connection
+from index_refresh import RefreshingIndex
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Identifiers are weighted above free text so "4500012345" finds its PO before a comment mentioning it
+FIELD_WEIGHTS = {
+    'sqcb': 3.0,
+    'rqmr_no': 3.0,
+    'rma_no': 3.0,
+    'po_no': 3.0,
+    'obd_no': 3.0,
+    'second_po_no': 3.0,
+    'second_obd_no': 3.0,
+    'notification_number': 3.0,
+    'part_number': 3.0,
+    'supplier_code': 2.0,
+    'supplier_name': 2.0,
+    'part_name': 2.0,
+    'status': 1.0,
+    'disposition': 1.0,
+    'hd_incharge': 1.0,
+    'comments': 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# A catch-up pass re-reads this much before the previous one started, for transactions that
+# committed after it with an earlier `modified`
+SYNC_OVERLAP_SECONDS = 60
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower()) if text is not None else []
+
+class SearchIndex(RefreshingIndex):
+    # Refreshes catch up on rows modified or deleted since the last pass; the full rebuild
+    # every rebuild_age also picks up supplier and part renames made by other workers
+    def __init__(self, max_age=120, rebuild_age=3600):
+        super().__init__(max_age)
+        self.rebuild_age = rebuild_age
+        self._rebuilt_at = None
+        # Database time at which the last pass started reading
+        self._synced_to = None
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch_documents(self, ids=None, since=None):
+        # Returns (documents, deleted ids, database time the read started); the last two are
+        # only read for refreshes (ids is None)
+        connection = None
+        cursor = None
+        try:
+            connection = create_db_connection(read_only=ids is None)
+            cursor = connection.cursor(dictionary=True)
+            read_at = None
+            deleted = []
+            if ids is None:
+                cursor.execute("SELECT NOW() AS now")
+                read_at = cursor.fetchone()['now']
+            if since is not None:
+                cursor.execute(
+                    "SELECT id FROM sqcb_detail WHERE is_deleted = 1 AND deleted_at >= %s", (since,)
+                )
+                deleted = [row['id'] for row in cursor.fetchall()]
+
+            sqcb_query = """
+                SELECT
+                    s.id, s.sqcb, s.status, s.rqmr_no, s.disposition, s.hd_incharge,
+                    s.rma_no, s.po_no, s.obd_no, s.second_po_no, s.second_obd_no, s.comments,
+                    sd.supplier_code, sd.supplier_name
+                FROM sqcb_detail s
+                LEFT JOIN supp_detail sd
+                  ON s.supplier_code = sd.supplier_code
+                WHERE s.is_deleted = 0
+            """
+            params = []
+            if ids is not None:
+                sqcb_query += f" AND s.id IN ({', '.join(['%s'] * len(ids))})"
+                params = list(ids)
+            elif since is not None:
+                sqcb_query += " AND s.modified >= %s"
+                params = [since]
+            cursor.execute(sqcb_query, params)
+            documents = {row['id']: [row] for row in cursor.fetchall()}
+            if not documents:
+                return documents, deleted, read_at
+
+            by_sqcb = {}
+            for doc_id, rows in documents.items():
+                by_sqcb.setdefault(rows[0]['sqcb'], []).append(doc_id)
+
+            parts_query = """
+                SELECT nd.sqcb, nd.notification_number, nd.part_number, pd.part_name
+                FROM notification_detail nd
+                LEFT JOIN part_detail pd
+                  ON nd.part_number = pd.part_number
+                WHERE nd.is_deleted = 0
+            """
+            params = []
+            if ids is not None or since is not None:
+                parts_query += f" AND nd.sqcb IN ({', '.join(['%s'] * len(by_sqcb))})"
+                params = list(by_sqcb)
+            cursor.execute(parts_query, params)
+            for part in cursor.fetchall():
+                for doc_id in by_sqcb.get(part['sqcb'], ()):
+                    documents[doc_id].append(part)
+            return documents, deleted, read_at
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
+    @staticmethod
+    def _weigh(rows):
+        terms = {}
+        for row in rows:
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(row.get(field)):
+                    terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def _add(self, doc_id, terms):
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for token, weight in terms.items():
+            self._postings.setdefault(token, {})[doc_id] = weight
+
+    def load(self):
+        if self._rebuilt_at is None or time.monotonic() - self._rebuilt_at > self.rebuild_age:
+            self._rebuild()
+        else:
+            self._catch_up()
+        self._loaded_at = time.monotonic()
+
+    def _rebuild(self):
+        documents, _, read_at = self._fetch_documents()
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0.0
+            for doc_id, rows in documents.items():
+                self._add(doc_id, self._weigh(rows))
+        self._synced_to = read_at
+        self._rebuilt_at = time.monotonic()
+
+    def _catch_up(self):
+        since = self._synced_to - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        documents, deleted, read_at = self._fetch_documents(since=since)
+        with self._lock:
+            for doc_id in deleted:
+                self._remove(doc_id)
+            for doc_id, rows in documents.items():
+                self._remove(doc_id)
+                self._add(doc_id, self._weigh(rows))
+        self._synced_to = read_at
+
+    def reindex(self, ids):
+        # Called after a committed write; ids no longer live are dropped
+        if not ids or self._loaded_at is None:
+            return
+        try:
+            documents, _, _ = self._fetch_documents(ids)
+        except Exception:
+            traceback.print_exc()
+            return
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+                if doc_id in documents:
+                    self._add(doc_id, self._weigh(documents[doc_id]))
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(self, query, offset=0, limit=20):
+        # Every query token must match; returns (total, [(doc_id, score), ...])
+        self.ensure_loaded()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+        with self._lock:
+            postings = [self._postings.get(token) for token in tokens]
+            if not all(postings):
+                return 0, []
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return 0, []
+
+            doc_count = len(self._doc_lengths)
+            average_length = self._total_length / doc_count if doc_count else 1.0
+            scores = {}
+            for posting in postings:
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id in candidates:
+                    tf = posting[doc_id]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return len(ranked), ranked[offset:offset + limit]
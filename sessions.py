@@ -0,0 +1,229 @@
+# sessions.py
+# Signed session tokens validated from memory, revocations shared across processes,
+# and batched last_login writes
+import atexit
+import os
+import threading
+import time
+import traceback
+import uuid
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+from config import create_db_connection
+
+MAX_CACHED_TOKENS = 50000
+# A logout reaches the other worker processes within this many seconds
+REVOCATION_POLL_SECONDS = float(os.environ.get('SQCB_REVOCATION_POLL_SECONDS', 2))
+REVOCATION_PRUNE_SECONDS = 3600
+
+SESSION_REVOCATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS session_revocations (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        sid CHAR(32) NOT NULL,
+        expires_at BIGINT NOT NULL,
+        KEY expires_at (expires_at)
+    )
+"""
+
+class SessionManager:
+    def __init__(self, secret_key, max_age=8 * 3600, salt='sqcb-session'):
+        self.max_age = max_age
+        self._serializer = URLSafeTimedSerializer(secret_key, salt=salt)
+        # token -> (payload, expires_at); revoked session id -> expires_at
+        self._cache = {}
+        self._revoked = {}
+        self._lock = threading.Lock()
+        # Revocations are shared through session_revocations, polled by a thread per process
+        self._last_revocation_id = 0
+        self._sync_thread = None
+        self._sync_pid = None
+        self._table_ready = False
+
+    def _prune(self, now):
+        for token, (_, expires_at) in list(self._cache.items()):
+            if expires_at <= now:
+                del self._cache[token]
+        for sid, expires_at in list(self._revoked.items()):
+            if expires_at <= now:
+                del self._revoked[sid]
+
+    def _remember(self, token, payload, expires_at):
+        with self._lock:
+            if len(self._cache) >= MAX_CACHED_TOKENS:
+                self._prune(time.time())
+                if len(self._cache) >= MAX_CACHED_TOKENS:
+                    self._cache.clear()
+            self._cache[token] = (payload, expires_at)
+
+    def issue(self, user):
+        payload = {"sid": uuid.uuid4().hex, "user_id": user['user_id'], "role": user.get('role')}
+        token = self._serializer.dumps(payload)
+        self._remember(token, payload, time.time() + self.max_age)
+        return token
+
+    def validate(self, token):
+        # Cache hit costs a dict lookup; a miss verifies the signature once and caches it
+        if not token:
+            return None
+        self._ensure_sync()
+        now = time.time()
+        cached = self._cache.get(token)
+        if cached is not None:
+            payload, expires_at = cached
+            if expires_at <= now:
+                self._cache.pop(token, None)
+                return None
+        else:
+            try:
+                payload, signed_at = self._serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+            except (BadSignature, SignatureExpired):
+                return None
+            self._remember(token, payload, signed_at.timestamp() + self.max_age)
+        if payload.get('sid') in self._revoked:
+            return None
+        return payload
+
+    def revoke(self, token):
+        payload = self.validate(token)
+        if payload is None:
+            return False
+        _, expires_at = self._cache.get(token, (None, time.time() + self.max_age))
+        # Written before the local update so a failed write surfaces to the caller
+        connection = None
+        cursor = None
+        try:
+            connection = create_db_connection()
+            cursor = connection.cursor()
+            self._ensure_table(cursor)
+            cursor.execute(
+                "INSERT INTO session_revocations (sid, expires_at) VALUES (%s, %s)",
+                (payload['sid'], int(expires_at) + 1)
+            )
+            connection.commit()
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+        with self._lock:
+            self._cache.pop(token, None)
+            self._revoked[payload['sid']] = expires_at
+        return True
+
+    def _ensure_table(self, cursor):
+        # Either the first revoke or the poll thread may get here first
+        if not self._table_ready:
+            cursor.execute(SESSION_REVOCATIONS_TABLE)
+            self._table_ready = True
+
+    def _ensure_sync(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._sync_pid != os.getpid():
+            with self._lock:
+                if self._sync_pid != os.getpid():
+                    self._sync_pid = os.getpid()
+                    self._last_revocation_id = 0
+                    self._sync_thread = threading.Thread(
+                        target=self._run_sync, name='session-revocations', daemon=True
+                    )
+                    self._sync_thread.start()
+
+    def _run_sync(self):
+        last_prune = 0.0
+        while True:
+            connection = None
+            cursor = None
+            try:
+                connection = create_db_connection()
+                cursor = connection.cursor()
+                self._ensure_table(cursor)
+                now = time.time()
+                cursor.execute(
+                    "SELECT id, sid, expires_at FROM session_revocations WHERE id > %s AND expires_at > %s",
+                    (self._last_revocation_id, int(now))
+                )
+                rows = cursor.fetchall()
+                if rows:
+                    with self._lock:
+                        for revocation_id, sid, expires_at in rows:
+                            self._revoked[sid] = float(expires_at)
+                            self._last_revocation_id = max(self._last_revocation_id, revocation_id)
+                if now - last_prune > REVOCATION_PRUNE_SECONDS:
+                    cursor.execute("DELETE FROM session_revocations WHERE expires_at <= %s", (int(now),))
+                    connection.commit()
+                    with self._lock:
+                        self._prune(now)
+                    last_prune = now
+                else:
+                    # Ends the read snapshot so the next poll sees new rows
+                    connection.commit()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                if cursor:
+                    cursor.close()
+                if connection:
+                    connection.close()
+            time.sleep(REVOCATION_POLL_SECONDS)
+
+class LastLoginWriter:
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+            self._thread.start()
+
+    def record(self, user_id, password_hash, when):
+        with self._lock:
+            # Repeated logins between flushes collapse into one row
+            self._pending[user_id] = (user_id, password_hash, when)
+            self._ensure_thread()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        connection = None
+        cursor = None
+        try:
+            connection = create_db_connection()
+            cursor = connection.cursor()
+            cursor.executemany("""
+                INSERT INTO user_authentication (user_id, password_hash, last_login)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                password_hash = VALUES(password_hash),
+                last_login = VALUES(last_login)
+            """, list(pending.values()))
+            connection.commit()
+        except Exception:
+            traceback.print_exc()
+            # Put the rows back unless a newer login for the same user arrived meanwhile
+            with self._lock:
+                for user_id, row in pending.items():
+                    self._pending.setdefault(user_id, row)
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
+last_login_writer = LastLoginWriter()
+atexit.register(last_login_writer.flush)
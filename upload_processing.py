@@ -0,0 +1,119 @@
+# upload_processing.py
+# Content sniffing, per-type size caps and photo normalization for uploads
+import codecs
+import io
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+MB = 1024 * 1024
+
+# (magic prefix, detected type); WEBP is checked separately because its tag sits at offset 8
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'%PDF-', 'pdf'),
+    (b'PK\x03\x04', 'zip'),  # also docx / xlsx / pptx
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole'),  # legacy doc / xls
+)
+IMAGE_TYPES = {'jpeg', 'png', 'gif', 'webp'}
+ATTACHMENT_TYPES = IMAGE_TYPES | {'pdf', 'zip', 'ole', 'text'}
+
+SIZE_LIMITS = {
+    'jpeg': 20 * MB,
+    'png': 20 * MB,
+    'webp': 20 * MB,
+    'gif': 10 * MB,
+    'pdf': 25 * MB,
+    'zip': 25 * MB,
+    'ole': 25 * MB,
+    'text': 5 * MB,
+}
+
+# Photos are stored no larger than this on their longest side
+MAX_IMAGE_DIMENSION = int(os.environ.get('SQCB_MAX_IMAGE_DIMENSION', 2048))
+JPEG_QUALITY = 85
+
+class UploadRejected(ValueError):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class PreparedUpload:
+    def __init__(self, filename, data, kind):
+        self.filename = filename
+        self.data = data
+        self.kind = kind
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+def sniff(head, complete=False):
+    # complete: head is the whole file, so a trailing partial character is an error
+    for magic, kind in SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    try:
+        # The slice may end mid-character; the incremental decoder holds those bytes back
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=complete)
+    except UnicodeDecodeError:
+        return None
+    return 'text' if b'\x00' not in head else None
+
+def normalize_image(data, kind):
+    # Re-encode when the photo carries EXIF or is larger than needed; GIFs may be animated, keep them
+    if Image is None or kind == 'gif':
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            has_exif = bool(image.info.get('exif')) or bool(image.getexif())
+            oversized = max(image.size) > MAX_IMAGE_DIMENSION
+            if not has_exif and not oversized:
+                return data
+            # Apply the EXIF orientation before dropping the metadata
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+            output = io.BytesIO()
+            if kind == 'jpeg':
+                if image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            elif kind == 'png':
+                image.save(output, 'PNG', optimize=True)
+            else:
+                image.save(output, 'WEBP', quality=JPEG_QUALITY)
+            return output.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise UploadRejected("Picture could not be decoded as an image")
+
+def prepare_upload(file_storage, filename, allowed_types):
+    stream = file_storage.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    head = stream.read(512)
+
+    kind = sniff(head, complete=size <= len(head))
+    if kind not in allowed_types:
+        raise UploadRejected(f"'{filename}' is not an allowed file type")
+    if size > SIZE_LIMITS[kind]:
+        raise UploadRejected(f"'{filename}' exceeds the {SIZE_LIMITS[kind] // MB} MB limit for {kind} files", 413)
+
+    data = head + stream.read()
+    if kind in IMAGE_TYPES:
+        data = normalize_image(data, kind)
+    return PreparedUpload(filename, data, kind)
+
+def prepare_picture(file_storage, filename):
+    return prepare_upload(file_storage, filename, IMAGE_TYPES)
+
+def prepare_attachment(file_storage, filename):
+    return prepare_upload(file_storage, filename, ATTACHMENT_TYPES)